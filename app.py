@@ -1,29 +1,34 @@
-def mapear_notas_canceladas(xml_files):
-    """Retorna um set com as chaves das notas canceladas."""
-    chaves_canceladas = set()
-    for xml_file in xml_files:
-        try:
-            tree = ET.parse(xml_file)
-            root = tree.getroot()
-            # Evento de cancelamento: tag raiz pode ser procEventoNFe
-            if root.tag.endswith('procEventoNFe'):
-                inf_evento = root.find('.//{http://www.portalfiscal.inf.br/nfe}infEvento')
-                if inf_evento is not None:
-                    tp_evento = inf_evento.find('{http://www.portalfiscal.inf.br/nfe}tpEvento')
-                    ch_nfe = inf_evento.find('{http://www.portalfiscal.inf.br/nfe}chNFe')
-                    if tp_evento is not None and tp_evento.text == '110111' and ch_nfe is not None:
-                        chaves_canceladas.add(ch_nfe.text)
-        except Exception:
-            continue
-    return chaves_canceladas
 import streamlit as st
 import pandas as pd
-import zipfile
 import os
-import xml.etree.ElementTree as ET
-import tempfile
+import hashlib
 from datetime import datetime
-from io import BytesIO   # para exportar Excel
+
+from extratores import listar_xmls_de_zip, LAYOUTS, LAYOUT_CABECALHO
+from paralelo import executar_pipeline, bytes_estimados, LoteConcluido, FonteConcluida, TAMANHO_LOTE_PADRAO
+from tabela import TabelaColunar
+from cache_lru import CacheLRU
+from exportacao import gerar_excel
+from armazenamento import ArmazemDocumentos
+from instrumentacao import Instrumentacao, ProgressoLimitado
+from sessao import SessaoIngestao
+from consulta import COLUNAS_FILTRO
+from quarentena import resumo_por_etapa, relatorio_csv, com_origem, COLUNAS_RELATORIO
+
+# Motor paralelo: número de processos (padrão: todos os núcleos) e XMLs por lote
+WORKERS = int(os.environ.get("LEITOR_XML_WORKERS", "0")) or None
+TAMANHO_LOTE = int(os.environ.get("LEITOR_XML_LOTE", TAMANHO_LOTE_PADRAO))
+# Limite (em MB) do cache de ZIPs já processados, compartilhado entre as sessões
+CACHE_LIMITE_MB = int(os.environ.get("LEITOR_XML_CACHE_MB", "512"))
+# Diretório do armazém persistente de documentos já extraídos (vazio desativa)
+DIRETORIO_ARMAZEM = os.environ.get("LEITOR_XML_ARMAZEM", os.path.join(os.path.expanduser("~"), ".leitor-xml"))
+# Paginação da tabela: só a página visível é enviada ao navegador
+TAMANHOS_PAGINA = [100, 500, 1000, 5000]
+TAMANHO_PAGINA_PADRAO = 1000
+# Linhas mostradas na prévia enquanto os ZIPs ainda estão sendo processados
+LINHAS_PREVIA = 200
+# Linhas da quarentena mostradas na tela (o relatório para download tem todas)
+LINHAS_QUARENTENA = 1000
 
 
 # ===============================
@@ -62,266 +67,170 @@ No caso de NF cancelada, é necessário que exista o evento de cancelamento para
 """, unsafe_allow_html=True)
 
 # ===============================
-# Função para extrair XMLs de um ZIP
+# Cache da ingestão (por conteúdo)
 # ===============================
-def extrair_xmls_de_zip(zip_path, extract_path):
-    xml_files = []
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        zip_ref.extractall(extract_path)
-        for root, _, files in os.walk(extract_path):
-            for file in files:
-                if file.endswith('.xml'):
-                    xml_files.append(os.path.join(root, file))
-    return xml_files
+# O Streamlit reexecuta o script a cada mudança de filtro; com o cache, só a
+# filtragem do pandas roda de novo. O cache é compartilhado entre as sessões
+# do servidor e limitado em tamanho (descarta o que foi usado há mais tempo).
+@st.cache_resource
+def cache_ingestao():
+    return CacheLRU(CACHE_LIMITE_MB * 1024 * 1024)
+
+
+@st.cache_resource
+def armazem_documentos():
+    """Armazém em disco: reenvios de ZIPs com XMLs já vistos não são analisados de novo."""
+    return ArmazemDocumentos(DIRETORIO_ARMAZEM) if DIRETORIO_ARMAZEM else None
+
+
+def com_nome_do_upload(quantidade, extraido, nome):
+    """(quantidade, extraido) com o nome deste upload nos rejeitados; o cache guarda só o caminho dentro do ZIP."""
+    tabela, documentos, erros = extraido
+    return quantidade, (tabela, documentos, com_origem(erros, nome))
+
+
+def ingerir_zips(uploaded_files, tipo_doc, layout, instrumentacao):
+    """Extrai os ZIPs enviados em um único pipeline e gera os eventos (LoteConcluido e FonteConcluida).
+
+    Um ZIP já visto (mesmo SHA-256 do conteúdo, tipo de documento e layout) vem do
+    cache, sem passar pelo pipeline; os demais são lidos e analisados em fluxo, e
+    cada um é guardado no cache assim que termina. O mesmo conteúdo pode chegar com
+    outro nome (ou de outro usuário), então a quarentena guardada não leva o nome do ZIP.
+    """
+    cache = cache_ingestao()
+    fontes = []
+    for uploaded_file in uploaded_files:
+        with instrumentacao.etapa("upload (hash)", 1):
+            conteudo = uploaded_file.getbuffer()
+            chave = ("zip", hashlib.sha256(conteudo).hexdigest(), tipo_doc, layout)
+        instrumentacao.contar("bytes enviados", len(conteudo))
+        extraido = cache.obter(chave)
+        if extraido is not None:
+            yield FonteConcluida(uploaded_file, *com_nome_do_upload(*extraido, uploaded_file.name))
+            continue
+        instrumentacao.contar("ZIPs analisados")
+        with instrumentacao.etapa("listar ZIP", 1):
+            fontes.append(((uploaded_file, chave), listar_xmls_de_zip(uploaded_file, "")))
+
+    for evento in executar_pipeline(
+        fontes, tipo_doc, layout,
+        workers=WORKERS,
+        tamanho_lote=TAMANHO_LOTE,
+        armazem=armazem_documentos(),
+        instrumentacao=instrumentacao
+    ):
+        if isinstance(evento, FonteConcluida):
+            uploaded_file, chave = evento.fonte
+            cache.guardar(chave, (evento.quantidade, evento.extraido), bytes_estimados(evento.extraido))
+            evento = FonteConcluida(uploaded_file, *com_nome_do_upload(evento.quantidade, evento.extraido, uploaded_file.name))
+        yield evento
+
+
+class PreviaLinhas:
+    """Primeiras linhas extraídas, mostradas enquanto os ZIPs seguintes ainda são lidos."""
+
+    def __init__(self, espaco, limite=LINHAS_PREVIA):
+        self.espaco = espaco
+        self.limite = limite
+        self.colunas = None
+        self.linhas = []
+
+    def acrescentar(self, resultado):
+        if len(self.linhas) >= self.limite or resultado.colunas is None:
+            return
+        if self.colunas is None:
+            self.colunas = resultado.colunas
+        antes = len(self.linhas)
+        for _, linhas, _, erro in resultado.documentos:
+            if erro is None:
+                self.linhas.extend(linhas[:self.limite - len(self.linhas)])
+        if len(self.linhas) > antes:
+            with self.espaco.container():
+                st.caption(f"Prévia: primeiras {len(self.linhas)} linha(s), antes dos filtros e da Situação")
+                st.dataframe(TabelaColunar.de_linhas(self.colunas, self.linhas).para_dataframe(), use_container_width=True)
+
+
+def sessao_ingestao(tipo_doc, layout):
+    """Arquivos já ingeridos nesta sessão (por `file_id`); recomeça se o tipo ou o layout mudar."""
+    sessao = st.session_state.get("ingestao")
+    if sessao is None or (sessao.tipo_doc, sessao.layout) != (tipo_doc, layout):
+        sessao = st.session_state["ingestao"] = SessaoIngestao(tipo_doc, layout)
+    return sessao
+
+
+def atualizar_eventos_do_armazem(sessao, instrumentacao):
+    """Eventos (cancelamentos, cartas de correção) enviados em outros momentos também contam.
+
+    Só as chaves dos documentos da sessão são consultadas, e só de novo se houver
+    evento novo no armazém ou se os arquivos da sessão mudarem.
+    """
+    armazem = armazem_documentos()
+    if armazem is None:
+        return
+    versao = (armazem.versao_eventos(), frozenset(sessao.arquivos))
+    if sessao.versao_externas != versao:
+        with instrumentacao.etapa("eventos do armazém"):
+            sessao.atualizar_eventos_externos(armazem.eventos(sessao.chaves_documentos()), versao)
 
 # ===============================
-# Processar NFe por item
+# Quarentena
 # ===============================
-def processar_nfe_por_item(xml_path, ns):
-    try:
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
-
-        emit = root.find('.//ns:emit', ns)
-        ide = root.find('.//ns:ide', ns)
-        total = root.find('.//ns:total', ns)
-        det_list = root.findall('.//ns:det', ns)
-
-        if emit is None or ide is None or total is None:
-            return []
-
-        chave_acesso_tag = root.find('.//ns:infProt/ns:chNFe', ns)
-        chave_acesso = chave_acesso_tag.text if chave_acesso_tag is not None else ""
-
-        status_tag = root.find('.//ns:infProt/ns:cStat', ns)
-        status = status_tag.text if status_tag is not None else ""
-
-        emitente = emit.find('ns:xNome', ns).text if emit.find('ns:xNome', ns) is not None else ""
-        cnpj_emitente = emit.find('ns:CNPJ', ns).text if emit.find('ns:CNPJ', ns) is not None else ""
-        uf_emitente = emit.find('ns:enderEmit/ns:UF', ns).text if emit.find('ns:enderEmit/ns:UF', ns) is not None else ""
-        numero_nfe = ide.find('ns:nNF', ns).text if ide.find('ns:nNF', ns) is not None else ""
-        data_emissao = ide.find('ns:dhEmi', ns).text if ide.find('ns:dhEmi', ns) is not None else ""
-
-        dados = []
-        for det in det_list:
-            prod = det.find('ns:prod', ns)
-            imposto = det.find('ns:imposto', ns)
-            if prod is None or imposto is None:
-                continue
-
-            icms = imposto.find('.//ns:ICMS', ns)
-            icms_valor = icms.find('.//ns:vICMS', ns)
-            icms_aliquota = icms.find('.//ns:pICMS', ns)
-            icms_cst = icms.find('.//ns:CST', ns)
-            icms_desonerado = icms.find('.//ns:vICMSDeson', ns)
-
-            ipi_valor = imposto.find('.//ns:IPI/ns:IPITrib/ns:vIPI', ns)
-            pis_valor = imposto.find('.//ns:PIS/ns:PISAliq/ns:vPIS', ns)
-            cofins_valor = imposto.find('.//ns:COFINS/ns:COFINSAliq/ns:vCOFINS', ns)
-            icms_st_valor = imposto.find('.//ns:ICMS/*/ns:vICMSST', ns)
-
-            cbenef = prod.find('ns:cBenef', ns)
-            cfop = prod.find('ns:CFOP', ns)
-
-            frete = root.find('.//ns:transp/ns:vFrete', ns)
-            seguro = root.find('.//ns:transp/ns:vSeg', ns)
-
-            vprod = prod.find('ns:vProd', ns)
-            dados.append({
-                "Número NFe": numero_nfe,
-                "Data de Emissão": data_emissao,
-                "CNPJ Emitente": cnpj_emitente,
-                "Emitente": emitente,
-                "UF Emitente": uf_emitente,
-                "Valor Total do Produto": vprod.text if vprod is not None else "",
-                "ICMS": icms_valor.text if icms_valor is not None else "",
-                "Alíquota ICMS": icms_aliquota.text if icms_aliquota is not None else "",
-                "IPI": ipi_valor.text if ipi_valor is not None else "",
-                "PIS": pis_valor.text if pis_valor is not None else "",
-                "COFINS": cofins_valor.text if cofins_valor is not None else "",
-                "ICMS ST": icms_st_valor.text if icms_st_valor is not None else "",
-                "Frete": frete.text if frete is not None else "",
-                "Seguro": seguro.text if seguro is not None else "",
-                "Chave de Acesso": chave_acesso,
-                "cBenef": cbenef.text if cbenef is not None else "",
-                "ICMS Desonerado": icms_desonerado.text if icms_desonerado is not None else "",
-                "CFOP": cfop.text if cfop is not None else "",
-                "CST ICMS": icms_cst.text if icms_cst is not None else "",
-                "Status da NFe": status
-            })
-        return dados
-    except ET.ParseError:
-        st.error(f"Erro ao analisar o arquivo XML: {os.path.basename(xml_path)}")
-        return []
+def mostrar_quarentena(rejeitados):
+    """Um único aviso com os XMLs que ficaram de fora (por etapa) e o relatório completo para download."""
+    por_etapa = ", ".join(f"{etapa}: {quantidade}" for etapa, quantidade in resumo_por_etapa(rejeitados).items())
+    st.warning(f"{len(rejeitados)} XML(s) ficaram de fora da planilha ({por_etapa}).")
+    with st.expander("🗂️ Quarentena", expanded=False):
+        st.dataframe(
+            pd.DataFrame(rejeitados[:LINHAS_QUARENTENA], columns=COLUNAS_RELATORIO),
+            hide_index=True,
+            use_container_width=True
+        )
+        if len(rejeitados) > LINHAS_QUARENTENA:
+            st.caption(f"Mostrando os primeiros {LINHAS_QUARENTENA}; o relatório tem todos os {len(rejeitados)}.")
+        st.download_button(
+            label="Baixar relatório da quarentena (.csv)",
+            data=lambda: relatorio_csv(rejeitados),
+            file_name="quarentena.csv",
+            mime="text/csv"
+        )
 
-# ===============================
-# Processar NFe por cabeçalho
-# ===============================
-def processar_nfe_por_cabecalho(xml_path, ns):
-    try:
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
-        # Tenta pegar o CFOP do primeiro item (det)
-        det = root.find('.//ns:det', ns)
-        cfop = det.find('ns:prod/ns:CFOP', ns).text if det is not None and det.find('ns:prod/ns:CFOP', ns) is not None else ""
-        # ...restante do código permanece igual...
-        emit = root.find('.//ns:emit', ns)
-        ide = root.find('.//ns:ide', ns)
-        total = root.find('.//ns:total', ns)
-        if emit is None or ide is None or total is None:
-            return []
-
-        chave_acesso_tag = root.find('.//ns:infProt/ns:chNFe', ns)
-        chave_acesso = chave_acesso_tag.text if chave_acesso_tag is not None else ""
-
-        status_tag = root.find('.//ns:infProt/ns:cStat', ns)
-        status = status_tag.text if status_tag is not None else ""
-
-        emitente = emit.find('ns:xNome', ns).text if emit.find('ns:xNome', ns) is not None else ""
-        cnpj_emitente = emit.find('ns:CNPJ', ns).text if emit.find('ns:CNPJ', ns) is not None else ""
-        uf_emitente = emit.find('ns:enderEmit/ns:UF', ns).text if emit.find('ns:enderEmit/ns:UF', ns) is not None else ""
-        numero_nfe = ide.find('ns:nNF', ns).text if ide.find('ns:nNF', ns) is not None else ""
-        data_emissao = ide.find('ns:dhEmi', ns).text if ide.find('ns:dhEmi', ns) is not None else ""
-
-        # Identificadores extras
-    # cNF e cDV removidos conforme solicitado
-        # CST/CSOSN (do primeiro item)
-        cst_csosn = ""
-        if det is not None:
-            # Simples Nacional: busca CSOSN
-            csosn = det.find('.//ns:CSOSN', ns)
-            if csosn is not None and csosn.text:
-                cst_csosn = csosn.text
-            else:
-                # Regime normal: busca CST
-                cst = det.find('.//ns:CST', ns)
-                if cst is not None and cst.text:
-                    cst_csosn = cst.text
-        modelo = ide.find('ns:mod', ns).text if ide.find('ns:mod', ns) is not None else ""
-        serie = ide.find('ns:serie', ns).text if ide.find('ns:serie', ns) is not None else ""
-        versao = root.attrib.get('versao', "")
-        cUF = ide.find('ns:cUF', ns).text if ide.find('ns:cUF', ns) is not None else ""
-
-        frete = root.find('.//ns:transp/ns:vFrete', ns)
-        seguro = root.find('.//ns:transp/ns:vSeg', ns)
-
-        return [{
-            "Chave de Acesso": chave_acesso,
-            "Número NFe": numero_nfe,
-            "Série": serie,
-            "Modelo": modelo,
-            # "UF (cUF)": cUF,  # removido
-            # "Versão": versao,  # removido
-            "Data de Emissão": data_emissao,
-            "CNPJ Emitente": cnpj_emitente,
-            "Emitente": emitente,
-            "UF Emitente": uf_emitente,
-            "CFOP": cfop,
-            "Valor da Nota": total.find('ns:ICMSTot/ns:vNF', ns).text if total.find('ns:ICMSTot/ns:vNF', ns) is not None else "",
-            "CST/CSOSN": cst_csosn,
-            "ICMS": total.find('ns:ICMSTot/ns:vICMS', ns).text if total.find('ns:ICMSTot/ns:vICMS', ns) is not None else "",
-            "IPI": total.find('ns:ICMSTot/ns:vIPI', ns).text if total.find('ns:ICMSTot/ns:vIPI', ns) is not None else "",
-            "PIS": total.find('ns:ICMSTot/ns:vPIS', ns).text if total.find('ns:ICMSTot/ns:vPIS', ns) is not None else "",
-            "COFINS": total.find('ns:ICMSTot/ns:vCOFINS', ns).text if total.find('ns:ICMSTot/ns:vCOFINS', ns) is not None else "",
-            "ICMS ST": total.find('ns:ICMSTot/ns:vST', ns).text if total.find('ns:ICMSTot/ns:vST', ns) is not None else "",
-            "Frete": frete.text if frete is not None else "",
-            "Seguro": seguro.text if seguro is not None else "",
-            "ICMS Desonerado": total.find('ns:ICMSTot/ns:vICMSDeson', ns).text if total.find('ns:ICMSTot/ns:vICMSDeson', ns) is not None else "",
-            "Status da NFe": status
-        }]
-    except ET.ParseError:
-        st.error(f"Erro ao analisar o arquivo XML: {os.path.basename(xml_path)}")
-        return []
-
-        emit = root.find('.//ns:emit', ns)
-        ide = root.find('.//ns:ide', ns)
-        total = root.find('.//ns:total', ns)
-        if emit is None or ide is None or total is None:
-            return []
-
-        chave_acesso_tag = root.find('.//ns:infProt/ns:chNFe', ns)
-        chave_acesso = chave_acesso_tag.text if chave_acesso_tag is not None else ""
-
-        status_tag = root.find('.//ns:infProt/ns:cStat', ns)
-        status = status_tag.text if status_tag is not None else ""
-
-        emitente = emit.find('ns:xNome', ns).text if emit.find('ns:xNome', ns) is not None else ""
-        cnpj_emitente = emit.find('ns:CNPJ', ns).text if emit.find('ns:CNPJ', ns) is not None else ""
-        uf_emitente = emit.find('ns:enderEmit/ns:UF', ns).text if emit.find('ns:enderEmit/ns:UF', ns) is not None else ""
-        numero_nfe = ide.find('ns:nNF', ns).text if ide.find('ns:nNF', ns) is not None else ""
-        data_emissao = ide.find('ns:dhEmi', ns).text if ide.find('ns:dhEmi', ns) is not None else ""
-
-        # Identificadores extras
-        cNF = ide.find('ns:cNF', ns).text if ide.find('ns:cNF', ns) is not None else ""
-        cDV = ide.find('ns:cDV', ns).text if ide.find('ns:cDV', ns) is not None else ""
-        modelo = ide.find('ns:mod', ns).text if ide.find('ns:mod', ns) is not None else ""
-        serie = ide.find('ns:serie', ns).text if ide.find('ns:serie', ns) is not None else ""
-        versao = root.attrib.get('versao', "")
-        cUF = ide.find('ns:cUF', ns).text if ide.find('ns:cUF', ns) is not None else ""
-
-        frete = root.find('.//ns:transp/ns:vFrete', ns)
-        seguro = root.find('.//ns:transp/ns:vSeg', ns)
-
-        return [{
-            "Chave de Acesso": chave_acesso,
-            "Número NFe": numero_nfe,
-            "Série": serie,
-            "Modelo": modelo,
-            "UF (cUF)": cUF,
-            "Versão": versao,
-            "Data de Emissão": data_emissao,
-            "CNPJ Emitente": cnpj_emitente,
-            "CFOP": cfop,
-            "Emitente": emitente,
-            "UF Emitente": uf_emitente,
-            "Valor da Nota": total.find('ns:ICMSTot/ns:vNF', ns).text if total.find('ns:ICMSTot/ns:vNF', ns) is not None else "",
-            "CST/CSOSN": cst_csosn,
-            "ICMS": total.find('ns:ICMSTot/ns:vICMS', ns).text if total.find('ns:ICMSTot/ns:vICMS', ns) is not None else "",
-            "IPI": total.find('ns:ICMSTot/ns:vIPI', ns).text if total.find('ns:ICMSTot/ns:vIPI', ns) is not None else "",
-            "PIS": total.find('ns:ICMSTot/ns:vPIS', ns).text if total.find('ns:ICMSTot/ns:vPIS', ns) is not None else "",
-            "COFINS": total.find('ns:ICMSTot/ns:vCOFINS', ns).text if total.find('ns:ICMSTot/ns:vCOFINS', ns) is not None else "",
-            "ICMS ST": total.find('ns:ICMSTot/ns:vST', ns).text if total.find('ns:ICMSTot/ns:vST', ns) is not None else "",
-            "Frete": frete.text if frete is not None else "",
-            "Seguro": seguro.text if seguro is not None else "",
-            "ICMS Desonerado": total.find('ns:ICMSTot/ns:vICMSDeson', ns).text if total.find('ns:ICMSTot/ns:vICMSDeson', ns) is not None else "",
-            "Status da NFe": status
-        }]
-    except ET.ParseError:
-        st.error(f"Erro ao analisar o arquivo XML: {os.path.basename(xml_path)}")
-        return []
 
 # ===============================
-# Processar CTe
+# Desempenho
 # ===============================
-def processar_cte(xml_path, ns):
-    try:
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
-
-        ide = root.find('.//ns:ide', ns)
-        emit = root.find('.//ns:emit', ns)
-        valor_total = root.find('.//ns:vTPrest', ns)
-        icms = root.find('.//ns:ICMS00', ns)
-        chave_acesso_tag = root.find('.//ns:infProt/ns:chCTe', ns)
-
-        if ide is None or emit is None or valor_total is None or chave_acesso_tag is None:
-            return []
-
-        chave_acesso = chave_acesso_tag.text if chave_acesso_tag is not None else ""
-
-        return [{
-            "Número CTe": ide.find('ns:nCT', ns).text if ide.find('ns:nCT', ns) is not None else "",
-            "Data de Emissão": ide.find('ns:dhEmi', ns).text if ide.find('ns:dhEmi', ns) is not None else "",
-            "CNPJ Emitente": emit.find('ns:CNPJ', ns).text if emit.find('ns:CNPJ', ns) is not None else "",
-            "Emitente": emit.find('ns:xNome', ns).text if emit.find('ns:xNome', ns) is not None else "",
-            "UF Emitente": emit.find('ns:enderEmit/ns:UF', ns).text if emit.find('ns:enderEmit/ns:UF', ns) is not None else "",
-            "Valor Total": valor_total.text if valor_total is not None else "",
-            "ICMS": icms.find('ns:vICMS', ns).text if icms is not None and icms.find('ns:vICMS', ns) is not None else "",
-            "Chave de Acesso": chave_acesso
-        }]
-    except ET.ParseError:
-        st.error(f"Erro ao analisar o arquivo XML: {os.path.basename(xml_path)}")
-        return []
+def instrumentacao_da_sessao(chave):
+    """Instrumentação da sessão; recomeça quando muda o tipo de documento ou o layout."""
+    if st.session_state.get("desempenho_chave") != chave:
+        st.session_state["desempenho_chave"] = chave
+        st.session_state["desempenho"] = Instrumentacao()
+    return st.session_state["desempenho"]
+
+
+def mostrar_desempenho(instrumentacao):
+    """Painel recolhível com o tempo de cada etapa, a vazão e o log estruturado para download."""
+    with st.expander("⏱️ Desempenho", expanded=False):
+        contadores = instrumentacao.contadores
+        segundos_analise = sum(
+            registro["segundos"] for etapa, registro in instrumentacao.etapas.items() if etapa.startswith("análise")
+        )
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("XMLs analisados", contadores.get("documentos", 0) - contadores.get("documentos do armazém", 0))
+        col2.metric("MB lidos", f"{contadores.get('bytes lidos', 0) / 1024 / 1024:.1f}")
+        col3.metric("XMLs em quarentena", contadores.get("falhas de análise", 0))
+        col4.metric(
+            "XMLs/s por worker",
+            f"{(contadores.get('documentos', 0) - contadores.get('documentos do armazém', 0)) / segundos_analise:.0f}"
+            if segundos_analise else "-"
+        )
+        st.caption("Tempos de análise são somados entre os workers; ZIPs já processados vêm do cache e não aparecem de novo.")
+        st.dataframe(pd.DataFrame(instrumentacao.resumo()), hide_index=True, use_container_width=True)
+        st.download_button(
+            label="Baixar log de desempenho (.json)",
+            data=instrumentacao.para_json,
+            file_name="desempenho.json",
+            mime="application/json"
+        )
+
 
 # ===============================
 # Interface Streamlit
@@ -330,7 +239,10 @@ def main():
     st.title("XML to EXCEL")
 
     tipo_doc = st.radio("Tipo de Documento:", ["NFe", "CTe"])
-    layout = "Cabeçalho"  # Fixo, não mostra mais opção
+    if tipo_doc == "NFe":
+        layout = st.radio("Layout:", LAYOUTS, horizontal=True, help="Cabeçalho: uma linha por nota. Item: uma linha por produto (det).")
+    else:
+        layout = LAYOUT_CABECALHO
 
     uploaded_files = st.file_uploader(
         "Selecione um ou mais arquivos ZIP com os XMLs",
@@ -341,109 +253,125 @@ def main():
     )
 
     if uploaded_files:
+        instrumentacao = instrumentacao_da_sessao((tipo_doc, layout))
+        sessao = sessao_ingestao(tipo_doc, layout)
+        ids = [uploaded_file.file_id for uploaded_file in uploaded_files]
+        # Só os ZIPs novos são processados; os removidos da lista saem da sessão
+        sessao.manter_somente(ids)
+        novos = [uploaded_file for uploaded_file in uploaded_files if uploaded_file.file_id not in sessao]
         with st.spinner("Processando arquivos..."):
-            with tempfile.TemporaryDirectory() as temp_dir:
-                xml_files = []
-
-                for uploaded_file in uploaded_files:
-                    zip_path = os.path.join(temp_dir, uploaded_file.name)
-                    with open(zip_path, "wb") as f:
-                        f.write(uploaded_file.getbuffer())
-
-                    arquivos_extraidos = extrair_xmls_de_zip(zip_path, temp_dir)
-                    xml_files.extend(arquivos_extraidos)
-
-                # Remove duplicatas mantendo a ordem
-                xml_files = list(dict.fromkeys(xml_files))
-
-                if not xml_files:
-                    st.warning("Nenhum arquivo XML encontrado nos ZIPs.")
-                else:
-                    st.markdown(f"<div style='background-color:#E8EEF5; color:#1F2937; border-radius:8px; padding:0.7em 1em; margin-bottom:1em; font-size:1.1em;'><b>{len(xml_files)}</b> arquivo(s) XML encontrado(s)</div>", unsafe_allow_html=True)
-
-                    # Mapeia chaves de notas canceladas
-                    chaves_canceladas = mapear_notas_canceladas(xml_files)
-
-                    progress_bar = st.progress(0)
-                    dados_totais = []
-
-                    for i, xml_file in enumerate(xml_files):
-                        progress_bar.progress((i + 1) / len(xml_files))
-
-                        if tipo_doc == "NFe":
-                            ns = {'ns': 'http://www.portalfiscal.inf.br/nfe'}
-                            notas = processar_nfe_por_cabecalho(xml_file, ns)
-                            # Marca situação
-                            for nota in notas:
-                                chave = nota.get("Chave de Acesso", "")
-                                if chave in chaves_canceladas:
-                                    nota["Situação"] = "Cancelada"
-                                else:
-                                    nota["Situação"] = "Autorizada"
-                            dados_totais.extend(notas)
-                        else:
-                            ns = {'ns': 'http://www.portalfiscal.inf.br/cte'}
-                            dados_totais.extend(processar_cte(xml_file, ns))
-
-                    if dados_totais:
-                        df = pd.DataFrame(dados_totais)
-                        if 'Data de Emissão' in df.columns:
-                            df['Data de Emissão'] = pd.to_datetime(df['Data de Emissão'], errors='coerce', utc=True).dt.date
-
-                        with st.sidebar:
-                            st.markdown("<b>Filtros</b>", unsafe_allow_html=True)
-                            cfop_options = sorted(df['CFOP'].unique().tolist()) if 'CFOP' in df.columns else []
-                            selected_cfops = st.multiselect("Filtrar por CFOP:", cfop_options)
-
-                            if 'Data de Emissão' in df.columns and not df['Data de Emissão'].isna().all():
-                                min_date = df['Data de Emissão'].min()
-                                max_date = df['Data de Emissão'].max()
-                            else:
-                                min_date = max_date = datetime.now().date()
-
-                            start_date = st.date_input('Data de início', min_date)
-                            end_date = st.date_input('Data final', max_date)
-
-                        df_filtered = df.copy()
-
-                        if selected_cfops:
-                            df_filtered = df_filtered[df_filtered['CFOP'].isin(selected_cfops)]
-
-                        if 'Data de Emissão' in df_filtered.columns:
-                            df_filtered = df_filtered[(df_filtered['Data de Emissão'] >= start_date) & (df_filtered['Data de Emissão'] <= end_date)]
-
-                        st.markdown("""
-                            <div style='background-color:#F3F4F6; border-radius:10px; padding:1.5rem 1rem 1rem 1rem; margin-bottom:1.5rem;'>
-                                <h3 style='color:#1F2937; margin-bottom:0.5rem;'>Notas Extraídas</h3>
-                                <div style='font-size:0.95rem; color:#6B7280; margin-bottom:1rem;'>Veja abaixo a tabela com os dados extraídos dos XMLs.</div>
-                        """, unsafe_allow_html=True)
-                        st.dataframe(df_filtered, use_container_width=True)
-                        st.markdown("</div>", unsafe_allow_html=True)
-
-                        # Exporta para Excel
-                        output = BytesIO()
-                        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                            df_filtered.to_excel(writer, index=False, sheet_name='Notas')
-                        output.seek(0)
-
-                        # Define nome do arquivo com nome do emitente (se houver)
-                        nome_emitente = ""
-                        if 'Emitente' in df_filtered.columns and not df_filtered['Emitente'].isna().all():
-                            nome_emitente = df_filtered['Emitente'].iloc[0]
-                            if isinstance(nome_emitente, str):
-                                nome_emitente = nome_emitente.strip().replace(' ', '_').replace('/', '_')
-                        file_name = f"notas_{nome_emitente}.xlsx" if nome_emitente else "notas.xlsx"
-
-                        st.download_button(
-                            label="📥 Baixar Planilha Excel (.xlsx)",
-                            data=output,
-                            file_name=file_name,
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                            use_container_width=True,
-                            help="Baixe a planilha pronta para análise corporativa."
-                        )
+            if novos:
+                progress_bar = st.progress(0)
+                previa = PreviaLinhas(st.empty())
+                # Atualizar a barra custa caro: no máximo algumas vezes por segundo
+                progresso = ProgressoLimitado(lambda feitos, total: progress_bar.progress(feitos / total))
+                for evento in ingerir_zips(novos, tipo_doc, layout, instrumentacao):
+                    if isinstance(evento, LoteConcluido):
+                        progresso(evento.processados, evento.total)
+                        previa.acrescentar(evento.resultado)
                     else:
-                        st.warning("Nenhum dado válido foi extraído dos arquivos XML.")
+                        sessao.adicionar(evento.fonte.file_id, evento.quantidade, evento.extraido)
+                progress_bar.progress(1.0)
+                previa.espaco.empty()
+            atualizar_eventos_do_armazem(sessao, instrumentacao)
+            total_xmls = sessao.quantidade(ids)
+
+            if not total_xmls:
+                st.warning("Nenhum arquivo XML encontrado nos ZIPs.")
+            else:
+                st.markdown(f"<div style='background-color:#E8EEF5; color:#1F2937; border-radius:8px; padding:0.7em 1em; margin-bottom:1em; font-size:1.1em;'><b>{total_xmls}</b> arquivo(s) XML encontrado(s)</div>", unsafe_allow_html=True)
+
+                rejeitados = sessao.erros(ids)
+                if rejeitados:
+                    mostrar_quarentena(rejeitados)
+
+                with instrumentacao.etapa("montar DataFrame"):
+                    consulta = sessao.consulta(ids)
+                if sessao.indice.descartados:
+                    st.info(
+                        f"{len(sessao.indice.descartados)} XML(s) repetido(s) (mesma chave de acesso) foram ignorados "
+                        f"({sessao.indice.linhas_duplicadas} linha(s)); regra: {sessao.regra_duplicados}."
+                    )
+                if consulta is not None:
+                    with st.sidebar:
+                        st.markdown("<b>Filtros</b>", unsafe_allow_html=True)
+                        selecoes = {}
+                        for coluna in COLUNAS_FILTRO:
+                            opcoes = consulta.opcoes(coluna)
+                            if opcoes:
+                                selecoes[coluna] = st.multiselect(f"Filtrar por {coluna}:", opcoes)
+
+                        min_date, max_date = consulta.periodo() or (datetime.now().date(), datetime.now().date())
+                        start_date = st.date_input('Data de início', min_date)
+                        end_date = st.date_input('Data final', max_date)
+
+                        # A faixa de valor só filtra depois de mexida (assim as linhas sem valor continuam aparecendo)
+                        faixa_valor = None
+                        faixa = consulta.faixa_valor()
+                        if faixa is not None and faixa[0] < faixa[1]:
+                            escolhida = st.slider(f"{consulta.coluna_valor}:", faixa[0], faixa[1], faixa)
+                            if tuple(escolhida) != faixa:
+                                faixa_valor = escolhida
+
+                    # Os filtros devolvem posições de linhas: a tabela não é copiada
+                    with instrumentacao.etapa("filtros", consulta.tamanho):
+                        posicoes = consulta.filtrar(selecoes, (start_date, end_date), faixa_valor)
+                    total_linhas = len(posicoes)
+
+                    st.markdown("""
+                        <div style='background-color:#F3F4F6; border-radius:10px; padding:1.5rem 1rem 1rem 1rem; margin-bottom:1.5rem;'>
+                            <h3 style='color:#1F2937; margin-bottom:0.5rem;'>Notas Extraídas</h3>
+                            <div style='font-size:0.95rem; color:#6B7280; margin-bottom:1rem;'>Veja abaixo a tabela com os dados extraídos dos XMLs.</div>
+                    """, unsafe_allow_html=True)
+                    col_pagina, col_tamanho = st.columns([3, 1])
+                    tamanho_pagina = col_tamanho.selectbox(
+                        "Linhas por página", TAMANHOS_PAGINA, index=TAMANHOS_PAGINA.index(TAMANHO_PAGINA_PADRAO)
+                    )
+                    total_paginas = max(1, -(-total_linhas // tamanho_pagina))
+                    pagina = col_pagina.number_input("Página", min_value=1, max_value=total_paginas, value=1, step=1)
+                    inicio = (pagina - 1) * tamanho_pagina
+                    fim = min(inicio + tamanho_pagina, total_linhas)
+                    st.caption(
+                        f"Mostrando {inicio + 1 if total_linhas else 0}–{fim} de {total_linhas} linha(s) "
+                        f"(página {pagina} de {total_paginas})"
+                    )
+                    st.dataframe(
+                        consulta.pagina(posicoes, pagina, tamanho_pagina),
+                        use_container_width=True,
+                        column_config={"Data de Emissão": st.column_config.DateColumn(format="DD/MM/YYYY")}
+                    )
+                    st.markdown("</div>", unsafe_allow_html=True)
+
+                    with st.expander("📊 Totais por CFOP e mês", expanded=False):
+                        with instrumentacao.etapa("agregados", total_linhas):
+                            agregados = consulta.agregados(posicoes)
+                        st.dataframe(agregados, hide_index=True, use_container_width=True)
+
+                    # Define nome do arquivo com nome do emitente (se houver)
+                    nome_emitente = ""
+                    if 'Emitente' in consulta.df.columns and total_linhas:
+                        emitente = consulta.df['Emitente'].iloc[posicoes[0]]
+                        if isinstance(emitente, str):
+                            nome_emitente = emitente.strip().replace(' ', '_').replace('/', '_')
+                    file_name = f"notas_{nome_emitente}.xlsx" if nome_emitente else "notas.xlsx"
+
+                    def exportar():
+                        with instrumentacao.etapa("exportação Excel", total_linhas):
+                            return gerar_excel(consulta.linhas(posicoes))
+
+                    st.download_button(
+                        label="📥 Baixar Planilha Excel (.xlsx)",
+                        # A planilha só é gerada quando o botão é clicado
+                        data=exportar,
+                        file_name=file_name,
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                        use_container_width=True,
+                        help="Baixe a planilha pronta para análise corporativa."
+                    )
+                else:
+                    st.warning("Nenhum dado válido foi extraído dos arquivos XML.")
+
+        mostrar_desempenho(instrumentacao)
 
     st.markdown("---")
     st.markdown("<div style='text-align:right; color:#6B7280; font-size:0.95rem;'>Desenvolvido por Beatriz Lourenço</div>", unsafe_allow_html=True)
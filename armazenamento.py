@@ -0,0 +1,108 @@
+import os
+import pickle
+import sqlite3
+
+from extratores import VERSAO_EXTRACAO
+
+# O SQLite limita a quantidade de parâmetros por consulta
+TAMANHO_CONSULTA = 500
+
+
+class ArmazemDocumentos:
+    """Guarda em SQLite o que já foi extraído de cada XML, para não analisar o mesmo arquivo de novo.
+
+    Cada documento é identificado pelo SHA-256 do conteúdo (mais o tipo de documento, o
+    layout e a versão da extração) e indexado pela chave de acesso de 44 dígitos. Os eventos
+    (cancelamento, carta de correção...) ficam em uma tabela própria, para que um cancelamento
+    enviado semanas depois da nota ainda a marque como "Cancelada".
+    """
+
+    def __init__(self, diretorio):
+        os.makedirs(diretorio, exist_ok=True)
+        self.caminho = os.path.join(diretorio, "documentos.sqlite3")
+        with self._conectar() as conexao:
+            conexao.execute("PRAGMA journal_mode=WAL")
+            colunas = {linha[1] for linha in conexao.execute("PRAGMA table_info(documentos)")}
+            if colunas and not {"layout", "info"} <= colunas:
+                # Tabela de uma versão anterior: os documentos são refeitos sob demanda
+                conexao.execute("DROP TABLE documentos")
+            conexao.executescript("""
+                CREATE TABLE IF NOT EXISTS documentos (
+                    sha256 TEXT NOT NULL,
+                    tipo_doc TEXT NOT NULL,
+                    layout TEXT NOT NULL,
+                    versao INTEGER NOT NULL,
+                    chave TEXT,
+                    info BLOB,
+                    colunas BLOB,
+                    linhas BLOB NOT NULL,
+                    PRIMARY KEY (sha256, tipo_doc, layout, versao)
+                );
+                CREATE INDEX IF NOT EXISTS idx_documentos_chave ON documentos (chave);
+                CREATE TABLE IF NOT EXISTS eventos (
+                    chave TEXT NOT NULL,
+                    tp_evento TEXT NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    PRIMARY KEY (sha256, chave, tp_evento)
+                );
+                CREATE INDEX IF NOT EXISTS idx_eventos_chave ON eventos (chave);
+            """)
+
+    def _conectar(self):
+        # Uma conexão por operação: o servidor Streamlit usa uma thread por sessão
+        return sqlite3.connect(self.caminho, timeout=30)
+
+    def buscar(self, hashes, tipo_doc, layout):
+        """Retorna {sha256: (colunas, linhas, InfoDocumento)} dos documentos já guardados."""
+        encontrados = {}
+        hashes = list(dict.fromkeys(hashes))
+        with self._conectar() as conexao:
+            for inicio in range(0, len(hashes), TAMANHO_CONSULTA):
+                parte = hashes[inicio:inicio + TAMANHO_CONSULTA]
+                marcadores = ",".join("?" * len(parte))
+                cursor = conexao.execute(
+                    f"SELECT sha256, colunas, linhas, info FROM documentos "
+                    f"WHERE tipo_doc = ? AND layout = ? AND versao = ? AND sha256 IN ({marcadores})",
+                    [tipo_doc, layout, VERSAO_EXTRACAO, *parte]
+                )
+                for sha256, colunas, linhas, info in cursor:
+                    colunas = pickle.loads(colunas) if colunas is not None else None
+                    encontrados[sha256] = (colunas, pickle.loads(linhas), pickle.loads(info))
+        return encontrados
+
+    def guardar(self, tipo_doc, layout, documentos):
+        """Guarda uma lista de (sha256, colunas, linhas, InfoDocumento)."""
+        if not documentos:
+            return
+        registros = []
+        eventos = []
+        for sha256, colunas, linhas, info in documentos:
+            registros.append((
+                sha256, tipo_doc, layout, VERSAO_EXTRACAO, info.chave, pickle.dumps(info),
+                pickle.dumps(colunas) if colunas is not None else None,
+                pickle.dumps(linhas)
+            ))
+            eventos.extend((chave, tp_evento, sha256) for chave, tp_evento in info.eventos)
+        with self._conectar() as conexao:
+            conexao.executemany("INSERT OR REPLACE INTO documentos VALUES (?, ?, ?, ?, ?, ?, ?, ?)", registros)
+            conexao.executemany("INSERT OR IGNORE INTO eventos VALUES (?, ?, ?)", eventos)
+
+    def eventos(self, chaves):
+        """{chave: {tpEvento}} dos eventos já vistos (de qualquer envio) das `chaves` de acesso pedidas."""
+        eventos = {}
+        chaves = list(dict.fromkeys(chaves))
+        with self._conectar() as conexao:
+            for inicio in range(0, len(chaves), TAMANHO_CONSULTA):
+                parte = chaves[inicio:inicio + TAMANHO_CONSULTA]
+                marcadores = ",".join("?" * len(parte))
+                cursor = conexao.execute(
+                    f"SELECT DISTINCT chave, tp_evento FROM eventos WHERE chave IN ({marcadores})", parte
+                )
+                for chave, tp_evento in cursor:
+                    eventos.setdefault(chave, set()).add(tp_evento)
+        return eventos
+
+    def versao_eventos(self):
+        """Muda sempre que um evento novo é guardado; serve de chave para caches que dependem dos eventos."""
+        with self._conectar() as conexao:
+            return conexao.execute("SELECT COALESCE(MAX(rowid), 0) FROM eventos").fetchone()[0]
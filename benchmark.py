@@ -0,0 +1,382 @@
+"""Benchmark da extração com um corpus sintético de NFe/CTe: `python benchmark.py -o resultado.json`.
+
+Gera ZIPs de tamanhos variados (NFe só cabeçalho, NFe com 1 a 5000 itens, CTe e
+uma parcela de eventos de cancelamento) e mede cada etapa isolada: leitura do ZIP,
+parse, extração (que inclui a classificação do documento: `classificar_xml` identifica
+o tipo e extrai as linhas na mesma leitura), motor paralelo, montagem do DataFrame e
+exportação para Excel. As etapas isoladas reprocessam o mesmo corpus, então não se
+somam; o tempo de ponta a ponta vem de uma execução real à parte (pipeline ->
+DataFrame -> Excel). O resultado vai para um JSON; com `--comparar` mostra a variação
+em relação a outra execução.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+NFE = "http://www.portalfiscal.inf.br/nfe"
+CTE = "http://www.portalfiscal.inf.br/cte"
+
+UFS = ("SP", "RJ", "MG", "PR", "SC", "RS", "BA", "GO")
+CFOPS = ("5102", "5405", "6102", "6108", "5949", "1202")
+
+# Intervalo (em segundos) entre as amostras de memória durante uma etapa
+INTERVALO_RSS = 0.005
+
+# Cenário: (tipo de documento, layout, faixa de itens por nota; None = --max-itens)
+CENARIOS = {
+    "nfe-cabecalho": ("NFe", "Cabeçalho", (1, 3)),
+    "nfe-itens": ("NFe", "Item", (1, None)),
+    "cte": ("CTe", "Cabeçalho", (0, 0)),
+}
+
+
+# ===============================
+# Corpus sintético
+# ===============================
+def chave_acesso(numero, modelo):
+    return f"35{24:02d}{1:02d}12345678000195{modelo}001{numero:09d}1{numero % 10 ** 8:08d}"[:43] + str(numero % 10)
+
+
+def sortear_itens(rng, minimo, maximo):
+    """Quantidade de itens com cauda longa: a maioria das notas é pequena, poucas chegam ao máximo."""
+    if maximo <= minimo:
+        return minimo
+    sorteio = rng.random()
+    if sorteio < 0.7:
+        return rng.randint(minimo, min(maximo, 10))
+    if sorteio < 0.97:
+        return rng.randint(minimo, min(maximo, 200))
+    return rng.randint(minimo, maximo)
+
+
+def xml_item(n, rng):
+    cfop = rng.choice(CFOPS)
+    if rng.random() < 0.3:
+        icms = "<ICMSSN102><orig>0</orig><CSOSN>102</CSOSN></ICMSSN102>"
+    else:
+        icms = f"<ICMS00><orig>0</orig><CST>00</CST><vBC>{n * 10}.00</vBC><pICMS>18.00</pICMS><vICMS>{n * 1.8:.2f}</vICMS></ICMS00>"
+    return (
+        f'<det nItem="{n}"><prod><cProd>{1000 + n}</cProd><cEAN>SEM GTIN</cEAN><xProd>Produto sintético {n}</xProd>'
+        f"<NCM>84713012</NCM><CFOP>{cfop}</CFOP><uCom>UN</uCom><qCom>{rng.randint(1, 50)}.0000</qCom>"
+        f"<vUnCom>{rng.uniform(1, 500):.2f}</vUnCom><vProd>{rng.uniform(1, 5000):.2f}</vProd><cBenef>SP{n:06d}</cBenef></prod>"
+        f"<imposto><ICMS>{icms}</ICMS><IPI><cEnq>999</cEnq><IPITrib><CST>50</CST><vIPI>{rng.uniform(0, 50):.2f}</vIPI></IPITrib></IPI>"
+        f"<PIS><PISAliq><CST>01</CST><vPIS>{rng.uniform(0, 20):.2f}</vPIS></PISAliq></PIS>"
+        f"<COFINS><COFINSAliq><CST>01</CST><vCOFINS>{rng.uniform(0, 80):.2f}</vCOFINS></COFINSAliq></COFINS></imposto></det>"
+    )
+
+
+def xml_nfe(numero, itens, rng):
+    modelo = "65" if rng.random() < 0.1 else "55"
+    chave = chave_acesso(numero, modelo)
+    emissao = datetime(2024, 1, 1) + timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+    dets = "".join(xml_item(n, rng) for n in range(1, itens + 1))
+    return chave, (
+        f'<?xml version="1.0" encoding="UTF-8"?><nfeProc xmlns="{NFE}" versao="4.00">'
+        f'<NFe><infNFe Id="NFe{chave}" versao="4.00"><ide><cUF>35</cUF><cNF>{numero % 10 ** 8:08d}</cNF><natOp>VENDA</natOp>'
+        f"<mod>{modelo}</mod><serie>1</serie><nNF>{numero}</nNF><dhEmi>{emissao:%Y-%m-%dT%H:%M:%S}-03:00</dhEmi><tpNF>1</tpNF></ide>"
+        f"<emit><CNPJ>{rng.randint(10 ** 13, 10 ** 14 - 1)}</CNPJ><xNome>Empresa {numero % 50} Ltda</xNome>"
+        f"<enderEmit><xLgr>Rua A</xLgr><nro>1</nro><UF>{rng.choice(UFS)}</UF></enderEmit><IE>123456789</IE><CRT>3</CRT></emit>"
+        f"<dest><CNPJ>99999999000191</CNPJ><xNome>Cliente</xNome></dest>{dets}"
+        f"<total><ICMSTot><vBC>100.00</vBC><vICMS>{rng.uniform(0, 500):.2f}</vICMS><vICMSDeson>0.00</vICMSDeson><vST>0.00</vST>"
+        f"<vProd>{rng.uniform(10, 90000):.2f}</vProd><vFrete>{rng.uniform(0, 100):.2f}</vFrete><vSeg>0.00</vSeg>"
+        f"<vIPI>0.00</vIPI><vPIS>0.65</vPIS><vCOFINS>3.00</vCOFINS><vNF>{rng.uniform(10, 90000):.2f}</vNF></ICMSTot></total>"
+        f"<transp><modFrete>0</modFrete></transp></infNFe></NFe>"
+        f"<protNFe versao=\"4.00\"><infProt><tpAmb>1</tpAmb><chNFe>{chave}</chNFe>"
+        f"<dhRecbto>{emissao:%Y-%m-%dT%H:%M:%S}-03:00</dhRecbto><nProt>1{numero:014d}</nProt><cStat>100</cStat></infProt></protNFe></nfeProc>"
+    )
+
+
+def xml_cancelamento(chave):
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?><procEventoNFe xmlns="{NFE}" versao="1.00"><evento versao="1.00">'
+        f'<infEvento Id="ID110111{chave}01"><cOrgao>35</cOrgao><tpAmb>1</tpAmb><chNFe>{chave}</chNFe>'
+        f"<dhEvento>2025-01-10T10:00:00-03:00</dhEvento><tpEvento>110111</tpEvento><nSeqEvento>1</nSeqEvento>"
+        f"<detEvento versao=\"1.00\"><descEvento>Cancelamento</descEvento><xJust>Erro na emissão</xJust></detEvento></infEvento></evento>"
+        f"<retEvento versao=\"1.00\"><infEvento><cStat>135</cStat><chNFe>{chave}</chNFe><tpEvento>110111</tpEvento></infEvento></retEvento></procEventoNFe>"
+    )
+
+
+def xml_cte(numero, rng):
+    chave = chave_acesso(numero, "57")
+    emissao = datetime(2024, 1, 1) + timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?><cteProc xmlns="{CTE}" versao="4.00"><CTe><infCte Id="CTe{chave}" versao="4.00">'
+        f"<ide><cUF>35</cUF><CFOP>5353</CFOP><mod>57</mod><serie>1</serie><nCT>{numero}</nCT>"
+        f"<dhEmi>{emissao:%Y-%m-%dT%H:%M:%S}-03:00</dhEmi></ide>"
+        f"<emit><CNPJ>11111111000111</CNPJ><xNome>Transportadora {numero % 20}</xNome><enderEmit><UF>{rng.choice(UFS)}</UF></enderEmit></emit>"
+        f"<vPrest><vTPrest>{rng.uniform(50, 5000):.2f}</vTPrest><vRec>0.00</vRec></vPrest>"
+        f"<imp><ICMS><ICMS00><CST>00</CST><vBC>50.00</vBC><pICMS>12.00</pICMS><vICMS>{rng.uniform(1, 600):.2f}</vICMS></ICMS00></ICMS></imp>"
+        f"<infCTeNorm><infCarga><vCarga>1000.00</vCarga></infCarga><infDoc><infNFe><chave>{chave_acesso(numero, '55')}</chave></infNFe></infDoc></infCTeNorm>"
+        f"</infCte></CTe><protCTe versao=\"4.00\"><infProt><chCTe>{chave}</chCTe><cStat>100</cStat></infProt></protCTe></cteProc>"
+    )
+
+
+def gerar_corpus(pasta, cenario, documentos, canceladas=0.05, max_itens=5000, semente=42):
+    """Grava o corpus do cenário em ZIPs de tamanhos variados e retorna a lista de caminhos."""
+    tipo_doc, _, (minimo, maximo) = CENARIOS[cenario]
+    maximo = max_itens if maximo is None else maximo
+    rng = random.Random(semente)
+    os.makedirs(pasta, exist_ok=True)
+    zips = []
+    numero = 0
+    while numero < documentos:
+        # ZIPs de 1% a 40% do corpus, para exercitar arquivos pequenos e grandes
+        tamanho = min(documentos - numero, max(1, int(documentos * rng.uniform(0.01, 0.4))))
+        caminho = os.path.join(pasta, f"{cenario}-{len(zips) + 1:03d}.zip")
+        with zipfile.ZipFile(caminho, "w", zipfile.ZIP_DEFLATED) as zip_ref:
+            for _ in range(tamanho):
+                numero += 1
+                if tipo_doc == "CTe":
+                    zip_ref.writestr(f"cte/{numero}.xml", xml_cte(numero, rng))
+                    continue
+                # A maior nota sai sempre no primeiro ZIP, para o pior caso estar no corpus
+                itens = maximo if numero == 1 else sortear_itens(rng, minimo, maximo)
+                chave, conteudo = xml_nfe(numero, itens, rng)
+                zip_ref.writestr(f"nfe/{numero}.xml", conteudo)
+                if rng.random() < canceladas:
+                    zip_ref.writestr(f"eventos/{numero}-canc.xml", xml_cancelamento(chave))
+        zips.append(caminho)
+    return zips
+
+
+# ===============================
+# Medição
+# ===============================
+def pico_rss_mb(quem=resource.RUSAGE_SELF):
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    pico = resource.getrusage(quem).ru_maxrss
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+def rss_atual_mb():
+    """RSS atual do processo (Linux, via /proc); None onde não houver /proc."""
+    try:
+        with open("/proc/self/statm") as arquivo:
+            return int(arquivo.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+
+class PicoRSS:
+    """Quanto o RSS subiu durante a etapa: o maior valor amostrado (por uma thread) menos o do início.
+
+    O `ru_maxrss` é o pico do processo inteiro: depois que uma etapa carrega o corpus,
+    todas as seguintes mostrariam pelo menos esse valor.
+    """
+
+    def __init__(self, intervalo=INTERVALO_RSS):
+        self.intervalo = intervalo
+        self.inicio = self.pico = None
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._amostrar, daemon=True)
+
+    def _amostrar(self):
+        while not self._parar.wait(self.intervalo):
+            self.pico = max(self.pico, rss_atual_mb())
+
+    def __enter__(self):
+        self.inicio = self.pico = rss_atual_mb()
+        if self.inicio is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *erro):
+        if self.inicio is not None:
+            self._parar.set()
+            self._thread.join()
+            self.pico = max(self.pico, rss_atual_mb())
+
+    @property
+    def acrescimo_mb(self):
+        return round(self.pico - self.inicio, 1) if self.inicio is not None else None
+
+
+def medir(etapas, nome, quantidade, funcao):
+    """Executa a etapa e registra tempo, vazão e memória; sem `quantidade`, usa len(resultado).
+
+    `rss_etapa_mb` é o quanto o RSS subiu durante a etapa; `pico_rss_mb`, o pico do processo até ali.
+    """
+    with PicoRSS() as rss:
+        inicio = time.perf_counter()
+        resultado = funcao()
+        segundos = time.perf_counter() - inicio
+    if quantidade is None:
+        quantidade = len(resultado)
+    etapas[nome] = {
+        "segundos": round(segundos, 4),
+        "quantidade": quantidade,
+        "por_segundo": round(quantidade / segundos, 1) if segundos else None,
+        "rss_etapa_mb": rss.acrescimo_mb,
+        "pico_rss_mb": round(pico_rss_mb(), 1),
+    }
+    return resultado
+
+
+def executar_cenario(cenario, zips, workers, tamanho_lote):
+    """Mede as etapas de um cenário. Roda em um processo próprio, para que o pico de RSS seja só dele."""
+    from extratores import listar_xmls_de_zip, classificar_xml, PARSER, ERROS_XML
+    from paralelo import processar_em_paralelo, juntar_resultados, executar_pipeline, FonteConcluida
+    from tabela import juntar_em_dataframe
+    from exportacao import gerar_excel
+
+    import pandas  # noqa: F401 (importado antes, para a montagem do DataFrame não medir o import)
+
+    tipo_doc, layout, _ = CENARIOS[cenario]
+    etapas = {}
+    xml_files = []
+
+    def descompactar():
+        conteudos = []
+        for caminho in zips:
+            listados = listar_xmls_de_zip(caminho, os.path.basename(caminho))
+            xml_files.extend(listados)
+            conteudos.extend(zip_ref.read(info) for _, zip_ref, info in listados)
+        return conteudos
+
+    conteudos = medir(etapas, "descompactar", None, descompactar)
+    documentos = len(conteudos)
+
+    def parse():
+        for conteudo in conteudos:
+            try:
+                PARSER.fromstring(conteudo)
+            except ERROS_XML:
+                pass
+
+    medir(etapas, "parse", documentos, parse)
+
+    def extrair():
+        linhas = 0
+        for conteudo in conteudos:
+            linhas += len(classificar_xml(conteudo, tipo_doc, layout)[1])
+        return linhas
+
+    linhas = medir(etapas, "extracao", documentos, extrair)
+    del conteudos
+
+    resultados = medir(etapas, "paralelo", documentos,
+                       lambda: processar_em_paralelo(xml_files, tipo_doc, layout, workers=workers, tamanho_lote=tamanho_lote))
+    etapas["paralelo"]["pico_rss_workers_mb"] = round(pico_rss_mb(resource.RUSAGE_CHILDREN), 1)
+    extraidos = [juntar_resultados(resultados)]
+    del resultados
+    df = medir(etapas, "dataframe", linhas, lambda: juntar_em_dataframe(extraidos, tipo_doc))
+    medir(etapas, "exportacao", linhas, lambda: gerar_excel(df))
+    del extraidos, df
+
+    def ponta_a_ponta():
+        # Uma execução real, como a do app/CLI: ZIPs -> pipeline -> DataFrame -> Excel
+        fontes = [(caminho, listar_xmls_de_zip(caminho, os.path.basename(caminho))) for caminho in zips]
+        extraidos = [
+            evento.extraido
+            for evento in executar_pipeline(fontes, tipo_doc, layout, workers=workers, tamanho_lote=tamanho_lote)
+            if isinstance(evento, FonteConcluida)
+        ]
+        return gerar_excel(juntar_em_dataframe(extraidos, tipo_doc))
+
+    final = {}
+    medir(final, "ponta_a_ponta", documentos, ponta_a_ponta)
+    return {
+        "cenario": cenario,
+        "tipo_doc": tipo_doc,
+        "layout": layout,
+        "zips": len(zips),
+        "bytes_zip": sum(os.path.getsize(caminho) for caminho in zips),
+        "documentos": documentos,
+        "linhas": linhas,
+        "ponta_a_ponta": final["ponta_a_ponta"],
+        "etapas": etapas,
+    }
+
+
+def versao_do_codigo():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def comparar(atual, anterior):
+    """Imprime a variação do tempo de cada etapa em relação a uma execução anterior."""
+    antes = {cenario["cenario"]: cenario for cenario in anterior["cenarios"]}
+    for cenario in atual["cenarios"]:
+        base = antes.get(cenario["cenario"])
+        if base is None:
+            continue
+        print(f"{cenario['cenario']} (vs {anterior.get('commit')}):")
+        etapas = dict(cenario["etapas"], ponta_a_ponta=cenario.get("ponta_a_ponta"))
+        etapas_base = dict(base["etapas"], ponta_a_ponta=base.get("ponta_a_ponta"))
+        for nome, etapa in etapas.items():
+            if etapa and etapas_base.get(nome) and etapas_base[nome]["segundos"]:
+                variacao = etapa["segundos"] / etapas_base[nome]["segundos"] - 1
+                print(f"  {nome:<13} {etapas_base[nome]['segundos']:>9.3f}s -> {etapa['segundos']:>9.3f}s ({variacao:+.1%})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark da extração de NFe/CTe com corpus sintético.")
+    parser.add_argument("--cenarios", nargs="+", choices=sorted(CENARIOS), default=sorted(CENARIOS))
+    parser.add_argument("--documentos", type=int, default=2000, help="XMLs por cenário (sem contar os cancelamentos)")
+    parser.add_argument("--canceladas", type=float, default=0.05, help="fração de notas com evento de cancelamento")
+    parser.add_argument("--max-itens", type=int, default=5000, help="máximo de itens (det) por nota no cenário nfe-itens")
+    parser.add_argument("--workers", type=int, default=None, help="processos do motor paralelo (padrão: todos os núcleos)")
+    parser.add_argument("--lote", type=int, default=256, help="XMLs por lote do motor paralelo")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--pasta", help="onde gravar o corpus (padrão: diretório temporário, apagado no fim)")
+    parser.add_argument("-o", "--saida", default="benchmark.json", help="arquivo JSON com o resultado")
+    parser.add_argument("--comparar", metavar="JSON", help="resultado anterior para comparação")
+    args = parser.parse_args(argv)
+
+    temporario = None if args.pasta else tempfile.TemporaryDirectory(prefix="benchmark-xml-")
+    pasta = args.pasta or temporario.name
+    from parser_xml import obter_parser
+
+    resultado = {
+        "commit": versao_do_codigo(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parser": obter_parser().nome,
+        "parametros": vars(args),
+        "cenarios": [],
+    }
+    contexto = multiprocessing.get_context("spawn")
+    try:
+        for cenario in args.cenarios:
+            zips = gerar_corpus(os.path.join(pasta, cenario), cenario, args.documentos, args.canceladas, args.max_itens, args.semente)
+            # Processo novo por cenário: o pico de memória de um não contamina o outro
+            with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as executor:
+                medido = executor.submit(executar_cenario, cenario, zips, args.workers, args.lote).result()
+            resultado["cenarios"].append(medido)
+            print(f"{cenario}: {medido['documentos']} XMLs, {medido['linhas']} linhas, "
+                  f"{medido['ponta_a_ponta']['segundos']:.2f}s de ponta a ponta", file=sys.stderr)
+            for nome, etapa in dict(medido["etapas"], ponta_a_ponta=medido["ponta_a_ponta"]).items():
+                rss = f"{etapa['rss_etapa_mb']:+.1f}" if etapa["rss_etapa_mb"] is not None else "-"
+                print(f"  {nome:<13} {etapa['segundos']:>9.3f}s {etapa['por_segundo'] or 0:>12.1f}/s "
+                      f"{rss:>8} MB (pico {etapa['pico_rss_mb']:.1f} MB)", file=sys.stderr)
+    finally:
+        if temporario is not None:
+            temporario.cleanup()
+
+    with open(args.saida, "w", encoding="utf-8") as arquivo:
+        json.dump(resultado, arquivo, ensure_ascii=False, indent=2)
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as arquivo:
+            comparar(resultado, json.load(arquivo))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+import threading
+from collections import OrderedDict
+
+
+class CacheLRU:
+    """Cache em memória limitado por tamanho: ao passar do limite, descarta as entradas usadas há mais tempo.
+
+    O tamanho de cada entrada (em bytes, estimado por quem guarda) é informado na inserção.
+    Os valores são devolvidos sem cópia, então quem usa não deve alterá-los.
+    """
+
+    def __init__(self, limite_bytes):
+        self.limite_bytes = limite_bytes
+        self.tamanho_bytes = 0
+        self._entradas = OrderedDict()
+        # O servidor Streamlit atende cada sessão em uma thread
+        self._trava = threading.Lock()
+
+    def obter(self, chave, padrao=None):
+        with self._trava:
+            if chave not in self._entradas:
+                return padrao
+            self._entradas.move_to_end(chave)
+            return self._entradas[chave][0]
+
+    def guardar(self, chave, valor, tamanho):
+        with self._trava:
+            if chave in self._entradas:
+                self.tamanho_bytes -= self._entradas.pop(chave)[1]
+            # Uma entrada maior que o limite inteiro não é guardada
+            if tamanho > self.limite_bytes:
+                return
+            self._entradas[chave] = (valor, tamanho)
+            self.tamanho_bytes += tamanho
+            while self.tamanho_bytes > self.limite_bytes:
+                _, (_, tamanho_antigo) = self._entradas.popitem(last=False)
+                self.tamanho_bytes -= tamanho_antigo
@@ -0,0 +1,243 @@
+"""Leitor de XMLs em lote, sem interface: `python cli.py ENTRADAS... -o notas.xlsx`.
+
+Aceita ZIPs, XMLs soltos, pastas (percorridas recursivamente) e padrões glob.
+Não importa o Streamlit; pandas e xlsxwriter só são carregados na hora de gravar.
+"""
+import argparse
+import glob
+import hashlib
+import os
+import pickle
+import sys
+import time
+
+FORMATOS = ("xlsx", "csv", "parquet")
+# Aumente quando mudar o que vai no checkpoint: os antigos deixam de ser usados
+VERSAO_CHECKPOINT = 2
+# XMLs em quarentena listados no terminal (o relatório de --quarentena tem todos)
+REJEITADOS_NO_TERMINAL = 10
+
+
+# ===============================
+# Entradas
+# ===============================
+class LeitorArquivos:
+    """Lê XMLs soltos no disco com a mesma interface de `ZipFile.read` usada pelo motor paralelo."""
+
+    def read(self, caminho):
+        with open(caminho, "rb") as arquivo:
+            return arquivo.read()
+
+
+def expandir_entradas(entradas):
+    """Resolve pastas e padrões glob em (ZIPs, XMLs soltos), sem repetir arquivos."""
+    arquivos = []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            for pasta, _, nomes in os.walk(entrada):
+                arquivos.extend(os.path.join(pasta, nome) for nome in sorted(nomes))
+        elif os.path.isfile(entrada):
+            arquivos.append(entrada)
+        else:
+            arquivos.extend(sorted(glob.glob(entrada, recursive=True)))
+    arquivos = list(dict.fromkeys(os.path.abspath(arquivo) for arquivo in arquivos if os.path.isfile(arquivo)))
+    zips = [arquivo for arquivo in arquivos if arquivo.lower().endswith(".zip")]
+    xmls = [arquivo for arquivo in arquivos if arquivo.lower().endswith(".xml")]
+    return zips, xmls
+
+
+def unidades_de_trabalho(zips, xmls):
+    """Cada ZIP é uma unidade; os XMLs soltos são agrupados por pasta. Retorna (nome, arquivos)."""
+    unidades = [(zip_path, [zip_path]) for zip_path in zips]
+    por_pasta = {}
+    for xml in xmls:
+        por_pasta.setdefault(os.path.dirname(xml), []).append(xml)
+    unidades.extend(por_pasta.items())
+    return unidades
+
+
+def listar_unidade(nome, arquivos, zips):
+    """Lista os XMLs da unidade no formato (nome, leitor, membro) esperado por `executar_pipeline`."""
+    from extratores import listar_xmls_de_zip
+
+    if nome in zips:
+        return listar_xmls_de_zip(nome, os.path.basename(nome))
+    leitor = LeitorArquivos()
+    return [(caminho, leitor, caminho) for caminho in arquivos]
+
+
+# ===============================
+# Retomada (checkpoint)
+# ===============================
+def identificar_unidade(arquivos, tipo_doc, layout):
+    """Identificador da unidade: muda se algum arquivo mudar (tamanho/data) ou se a extração mudar."""
+    from extratores import VERSAO_EXTRACAO
+
+    partes = [tipo_doc, layout, str(VERSAO_EXTRACAO), str(VERSAO_CHECKPOINT)]
+    for arquivo in arquivos:
+        estado = os.stat(arquivo)
+        partes.append(f"{arquivo}|{estado.st_size}|{estado.st_mtime_ns}")
+    return hashlib.sha256("\n".join(partes).encode("utf-8")).hexdigest()
+
+
+def carregar_checkpoint(pasta, identificador):
+    caminho = os.path.join(pasta, f"{identificador}.pkl")
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, "rb") as arquivo:
+        return pickle.load(arquivo)
+
+
+def salvar_checkpoint(pasta, identificador, extraido):
+    # Grava em arquivo temporário e renomeia: uma interrupção no meio não deixa checkpoint corrompido
+    caminho = os.path.join(pasta, f"{identificador}.pkl")
+    temporario = caminho + ".tmp"
+    with open(temporario, "wb") as arquivo:
+        pickle.dump(extraido, arquivo, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporario, caminho)
+
+
+# ===============================
+# Saída
+# ===============================
+def gravar_saida(df, caminho, formato):
+    if formato == "xlsx":
+        from exportacao import gerar_excel
+
+        # Direto no arquivo: a planilha não passa inteira pela memória
+        gerar_excel(df, destino=caminho)
+    elif formato == "csv":
+        # Padrão do Excel em português: ";" entre colunas e "," decimal
+        df.to_csv(caminho, index=False, sep=";", decimal=",", date_format="%d/%m/%Y", encoding="utf-8-sig")
+    else:
+        try:
+            df.to_parquet(caminho, index=False)
+        except ImportError as e:
+            raise SystemExit(f"Erro: a saída em parquet precisa do pyarrow ({e})")
+
+
+def criar_argumentos():
+    parser = argparse.ArgumentParser(
+        description="Converte XMLs de NFe/NFCe e CTe (soltos, em pastas ou em ZIPs) para Excel, CSV ou Parquet."
+    )
+    parser.add_argument("entradas", nargs="+", help="ZIPs, XMLs, pastas ou padrões glob (ex.: 'notas/**/*.zip')")
+    parser.add_argument("-o", "--saida", required=True, help="arquivo de saída (.xlsx, .csv ou .parquet)")
+    parser.add_argument("--formato", choices=FORMATOS, help="formato da saída (padrão: pela extensão de --saida)")
+    parser.add_argument("--tipo", choices=("NFe", "CTe"), default="NFe", help="tipo de documento (padrão: NFe)")
+    parser.add_argument("--layout", choices=("Cabeçalho", "Item"), default="Cabeçalho",
+                        help="NFe: uma linha por nota (Cabeçalho) ou por item (Item)")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("LEITOR_XML_WORKERS", "0")) or None,
+                        help="número de processos (padrão: todos os núcleos)")
+    parser.add_argument("--lote", type=int, default=None, help="XMLs enviados a cada processo por vez")
+    parser.add_argument("--retomar", metavar="PASTA",
+                        help="pasta de checkpoints: cada ZIP/pasta concluído é salvo e pulado numa nova execução")
+    parser.add_argument("--armazem", metavar="PASTA",
+                        help="armazém SQLite de documentos já extraídos (o mesmo usado pelo app)")
+    parser.add_argument("--duplicados", choices=("autorizada", "recente"), default=None,
+                        help="XMLs com a mesma chave: fica o autorizado (padrão) ou o de recebimento mais recente")
+    parser.add_argument("--quarentena", metavar="CSV",
+                        help="grava o relatório dos XMLs que ficaram de fora (arquivo, membro do ZIP, etapa e motivo)")
+    parser.add_argument("--sem-pre-verificacao", action="store_true",
+                        help="analisa todos os arquivos, sem descartar antes os que não parecem NFe/CTe")
+    parser.add_argument("--log-desempenho", metavar="JSON", help="grava o tempo de cada etapa em um log estruturado")
+    parser.add_argument("-q", "--silencioso", action="store_true", help="não mostra o progresso")
+    return parser
+
+
+def main(argv=None):
+    args = criar_argumentos().parse_args(argv)
+    formato = args.formato or os.path.splitext(args.saida)[1].lower().lstrip(".")
+    if formato not in FORMATOS:
+        raise SystemExit(f"Erro: formato de saída desconhecido: {args.saida!r} (use --formato)")
+
+    def avisar(mensagem):
+        if not args.silencioso:
+            print(mensagem, file=sys.stderr)
+
+    from extratores import LAYOUT_CABECALHO
+    from paralelo import executar_pipeline, FonteConcluida, TAMANHO_LOTE_PADRAO
+    from instrumentacao import Instrumentacao
+
+    layout = args.layout if args.tipo == "NFe" else LAYOUT_CABECALHO
+    zips, xmls = expandir_entradas(args.entradas)
+    unidades = unidades_de_trabalho(zips, xmls)
+    if not unidades:
+        raise SystemExit("Erro: nenhum ZIP ou XML encontrado nas entradas")
+
+    armazem = None
+    if args.armazem:
+        from armazenamento import ArmazemDocumentos
+        armazem = ArmazemDocumentos(args.armazem)
+    if args.retomar:
+        os.makedirs(args.retomar, exist_ok=True)
+
+    instrumentacao = Instrumentacao()
+    inicio = time.perf_counter()
+    # Unidades já concluídas vêm do checkpoint; as demais passam juntas pelo pipeline,
+    # na ordem original (a ordem decide os empates entre XMLs repetidos)
+    extraidos = [None] * len(unidades)
+    quantidades = [0] * len(unidades)
+    identificadores = [None] * len(unidades)
+    fontes = []
+    for n, (nome, arquivos) in enumerate(unidades):
+        if args.retomar:
+            identificadores[n] = identificar_unidade(arquivos, args.tipo, layout)
+            checkpoint = carregar_checkpoint(args.retomar, identificadores[n])
+            if checkpoint is not None:
+                quantidades[n], extraidos[n] = checkpoint
+                avisar(f"[{n + 1}/{len(unidades)}] {nome}: {quantidades[n]} XMLs (retomado do checkpoint)")
+                continue
+        fontes.append((n, lambda nome=nome, arquivos=arquivos: listar_unidade(nome, arquivos, zips)))
+
+    for evento in executar_pipeline(
+        fontes, args.tipo, layout, workers=args.workers,
+        tamanho_lote=args.lote or TAMANHO_LOTE_PADRAO, armazem=armazem, instrumentacao=instrumentacao,
+        pre_verificacao=not args.sem_pre_verificacao
+    ):
+        if not isinstance(evento, FonteConcluida):
+            continue
+        n = evento.fonte
+        quantidades[n], extraidos[n] = evento.quantidade, evento.extraido
+        if args.retomar:
+            salvar_checkpoint(args.retomar, identificadores[n], (evento.quantidade, evento.extraido))
+        avisar(f"[{n + 1}/{len(unidades)}] {unidades[n][0]}: {evento.quantidade} XMLs")
+    total_xmls = sum(quantidades)
+
+    from quarentena import resumo_por_etapa, relatorio_csv, descrever
+
+    rejeitados = [rejeitado for _, _, erros in extraidos for rejeitado in erros]
+    if rejeitados:
+        por_etapa = ", ".join(f"{etapa}: {quantidade}" for etapa, quantidade in resumo_por_etapa(rejeitados).items())
+        avisar(f"{len(rejeitados)} XMLs em quarentena ({por_etapa})")
+        for rejeitado in rejeitados[:REJEITADOS_NO_TERMINAL]:
+            avisar(f"  {descrever(rejeitado)}")
+        if len(rejeitados) > REJEITADOS_NO_TERMINAL and not args.quarentena:
+            avisar(f"  ... e mais {len(rejeitados) - REJEITADOS_NO_TERMINAL} (use --quarentena ARQUIVO.csv para o relatório completo)")
+    if args.quarentena:
+        with open(args.quarentena, "wb") as arquivo:
+            arquivo.write(relatorio_csv(rejeitados))
+
+    from tabela import juntar_em_dataframe
+    from indice_chaves import IndiceChaves, REGRA_PADRAO
+
+    indice = IndiceChaves(args.duplicados or REGRA_PADRAO)
+    eventos_armazem = None
+    if armazem is not None:
+        eventos_armazem = armazem.eventos(info.chave for _, documentos, _ in extraidos for info, _, _ in documentos if info.chave)
+    with instrumentacao.etapa("montar DataFrame"):
+        df = juntar_em_dataframe(extraidos, args.tipo, eventos_armazem, indice)
+    if indice.descartados:
+        avisar(f"{len(indice.descartados)} XMLs repetidos (mesma chave de acesso) ignorados pela regra '{indice.regra}'")
+    if df is None:
+        raise SystemExit("Erro: nenhum documento válido encontrado")
+    with instrumentacao.etapa(f"gravar {formato}", len(df)):
+        gravar_saida(df, args.saida, formato)
+    if args.log_desempenho:
+        with open(args.log_desempenho, "w", encoding="utf-8") as arquivo:
+            arquivo.write(instrumentacao.para_json())
+    avisar(f"{total_xmls} XMLs, {len(df)} linhas gravadas em {args.saida} ({time.perf_counter() - inicio:.1f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
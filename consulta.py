@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+
+# Colunas com filtro por lista de valores (as que existirem no layout)
+COLUNAS_FILTRO = ("CFOP", "Situação", "Modelo", "UF Emitente", "CNPJ Emitente")
+# Coluna de valor usada no filtro por faixa, na ordem de preferência
+COLUNAS_VALOR = ("Valor da Nota", "Valor Total", "Valor Total do Produto")
+# Somadas nos agregados por CFOP/mês
+COLUNAS_SOMA = COLUNAS_VALOR + ("ICMS", "ICMS ST", "IPI", "PIS", "COFINS")
+COLUNA_DATA = "Data de Emissão"
+
+
+class ConsultaNotas:
+    """Filtros, paginação e agregados sobre o DataFrame extraído, sem copiar a tabela inteira.
+
+    Os índices são montados uma vez por DataFrame:
+    - datas: posições das linhas ordenadas pela data de emissão, para recortar um
+      período com busca binária (searchsorted);
+    - colunas de filtro: códigos inteiros (como um Categorical), para filtrar por
+      lista de valores com uma tabela de consulta em vez de comparar textos.
+    Os filtros devolvem posições de linhas; só a página exibida (ou a exportação)
+    vira DataFrame.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.tamanho = len(df)
+        self.coluna_valor = next((coluna for coluna in COLUNAS_VALOR if coluna in df.columns), None)
+
+        self.codigos = {}
+        self.categorias = {}
+        for coluna in COLUNAS_FILTRO:
+            if coluna not in df.columns:
+                continue
+            serie = df[coluna]
+            if isinstance(serie.dtype, pd.CategoricalDtype):
+                codigos, categorias = serie.cat.codes.to_numpy(), serie.cat.categories
+            else:
+                codigos, categorias = pd.factorize(serie, sort=True)
+            self.codigos[coluna] = codigos
+            self.categorias[coluna] = categorias
+
+        self.datas = None
+        if COLUNA_DATA in df.columns:
+            # NaT vira o menor int64: fica no começo da ordem e fora de qualquer período
+            datas = df[COLUNA_DATA].to_numpy().astype("datetime64[ns]").view("int64")
+            self.ordem_datas = np.argsort(datas, kind="stable")
+            self.datas = datas[self.ordem_datas]
+
+    # ===============================
+    # Opções dos filtros
+    # ===============================
+    def opcoes(self, coluna):
+        """Valores distintos da coluna, em ordem (para o multiselect)."""
+        return [valor for valor in self.categorias.get(coluna, []) if pd.notna(valor) and valor != ""]
+
+    def periodo(self):
+        """(primeira, última) data de emissão, ou None se não houver datas."""
+        if self.datas is None:
+            return None
+        validas = self.datas[self.datas != np.iinfo(np.int64).min]
+        if not len(validas):
+            return None
+        return pd.Timestamp(validas[0]).date(), pd.Timestamp(validas[-1]).date()
+
+    def faixa_valor(self):
+        """(menor, maior) valor da coluna de valor, ou None se não houver valores."""
+        if self.coluna_valor is None:
+            return None
+        valores = self.df[self.coluna_valor].to_numpy()
+        if np.isnan(valores).all():
+            return None
+        return float(np.nanmin(valores)), float(np.nanmax(valores))
+
+    # ===============================
+    # Filtro
+    # ===============================
+    def filtrar(self, selecoes=None, periodo=None, faixa_valor=None):
+        """Posições (em ordem) das linhas que passam em todos os filtros.
+
+        `selecoes`: {coluna: valores aceitos}; lista vazia não filtra.
+        `periodo`: (data inicial, data final), ambas inclusivas.
+        `faixa_valor`: (mínimo, máximo) da coluna de valor.
+        """
+        if periodo is not None and self.datas is not None:
+            inicio = np.datetime64(pd.Timestamp(periodo[0]), "ns").view("int64")
+            fim = np.datetime64(pd.Timestamp(periodo[1]), "ns").view("int64")
+            esquerda = np.searchsorted(self.datas, inicio, side="left")
+            direita = np.searchsorted(self.datas, fim, side="right")
+            posicoes = np.sort(self.ordem_datas[esquerda:direita])
+        else:
+            posicoes = np.arange(self.tamanho)
+
+        for coluna, valores in (selecoes or {}).items():
+            if not valores or coluna not in self.codigos:
+                continue
+            # Tabela de consulta por código; o código -1 (vazio) cai na última posição, sempre False
+            aceitos = np.zeros(len(self.categorias[coluna]) + 1, dtype=bool)
+            aceitos[self.categorias[coluna].get_indexer(list(valores))] = True
+            aceitos[-1] = False
+            posicoes = posicoes[aceitos[self.codigos[coluna][posicoes]]]
+
+        if faixa_valor is not None and self.coluna_valor is not None:
+            valores = self.df[self.coluna_valor].to_numpy()[posicoes]
+            posicoes = posicoes[(valores >= faixa_valor[0]) & (valores <= faixa_valor[1])]
+        return posicoes
+
+    # ===============================
+    # Resultado
+    # ===============================
+    def linhas(self, posicoes):
+        """DataFrame só com as linhas filtradas (sem cópia se não houver filtro)."""
+        if len(posicoes) == self.tamanho:
+            return self.df
+        return self.df.iloc[posicoes]
+
+    def pagina(self, posicoes, numero, tamanho_pagina):
+        """A `numero`-ésima página (começando em 1) das linhas filtradas."""
+        inicio = (numero - 1) * tamanho_pagina
+        return self.df.iloc[posicoes[inicio:inicio + tamanho_pagina]]
+
+    def agregados(self, posicoes):
+        """Quantidade de linhas e somas de valores/impostos por CFOP e mês de emissão.
+
+        Cada linha recebe um código de grupo (CFOP x mês) e as somas saem de
+        `np.bincount`, sem agrupar textos: só os grupos presentes viram linhas.
+        """
+        chaves = []
+        if "CFOP" in self.codigos:
+            rotulos = np.append(np.asarray(self.categorias["CFOP"], dtype=object), "")
+            codigos = self.codigos["CFOP"][posicoes].astype(np.int64)
+            chaves.append(("CFOP", np.where(codigos < 0, len(rotulos) - 1, codigos), rotulos))
+        if COLUNA_DATA in self.df.columns:
+            meses = self.df[COLUNA_DATA].to_numpy()[posicoes].astype("datetime64[M]")
+            validos = ~np.isnat(meses)
+            numeros = meses.view("int64")
+            primeiro = numeros[validos].min() if validos.any() else 0
+            quantidade = int(numeros[validos].max() - primeiro + 1) if validos.any() else 0
+            rotulos = np.array(
+                [str(np.datetime64(int(primeiro + mes), "M")) for mes in range(quantidade)] + [""], dtype=object
+            )
+            chaves.append(("Mês", np.where(validos, numeros - primeiro, quantidade), rotulos))
+
+        grupo = np.zeros(len(posicoes), dtype=np.int64)
+        total_grupos = 1
+        for _, codigos, rotulos in chaves:
+            grupo = grupo * len(rotulos) + codigos
+            total_grupos *= len(rotulos)
+        contagem = np.bincount(grupo, minlength=total_grupos)
+        presentes = np.flatnonzero(contagem)
+
+        resultado = {}
+        resto = presentes
+        for nome, _, rotulos in reversed(chaves):
+            resultado[nome] = rotulos[resto % len(rotulos)]
+            resto = resto // len(rotulos)
+        resultado = {nome: resultado[nome] for nome, _, _ in chaves}
+        resultado["Quantidade"] = contagem[presentes]
+        for coluna in COLUNAS_SOMA:
+            if coluna in self.df.columns:
+                valores = np.nan_to_num(self.df[coluna].to_numpy()[posicoes])
+                resultado[coluna] = np.bincount(grupo, weights=valores, minlength=total_grupos)[presentes]
+        return pd.DataFrame(resultado)
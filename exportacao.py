@@ -0,0 +1,72 @@
+from datetime import date, datetime
+from io import BytesIO
+
+import xlsxwriter
+
+# Limite de linhas de uma aba do Excel (a primeira é o cabeçalho)
+LIMITE_LINHAS_EXCEL = 1_048_576
+TAMANHO_BLOCO = 50_000
+
+
+def _escritor_da_coluna(serie):
+    """Escolhe como gravar a coluna: número, data ou texto (de acordo com o tipo no DataFrame)."""
+    if serie.dtype.kind in "iuf":
+        return "numero"
+    if serie.dtype.kind == "M":
+        return "data"
+    amostra = serie.dropna()
+    if len(amostra) and isinstance(amostra.iloc[0], (date, datetime)):
+        return "data"
+    return "texto"
+
+
+def gerar_excel(df, nome_aba="Notas", linhas_por_aba=LIMITE_LINHAS_EXCEL - 1, tamanho_bloco=TAMANHO_BLOCO, destino=None):
+    """Gera o .xlsx do DataFrame e devolve os bytes (ou grava direto em `destino`, um caminho, e devolve None).
+
+    Usa o modo constant_memory do xlsxwriter: as linhas são gravadas em blocos e
+    descarregadas para disco, sem montar a planilha inteira na memória. Ao passar
+    do limite de linhas do Excel, continua em novas abas (Notas_2, Notas_3...).
+    Números e datas viram células tipadas, não texto.
+    """
+    output = BytesIO() if destino is None else destino
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True, "remove_timezone": True})
+    negrito = workbook.add_format({"bold": True})
+    formato_data = workbook.add_format({"num_format": "dd/mm/yyyy"})
+
+    colunas = list(df.columns)
+    escritores = [_escritor_da_coluna(df[coluna]) for coluna in colunas]
+
+    def nova_aba(numero):
+        worksheet = workbook.add_worksheet(nome_aba if numero == 1 else f"{nome_aba}_{numero}")
+        for c, coluna in enumerate(colunas):
+            worksheet.write_string(0, c, str(coluna), negrito)
+            if escritores[c] == "data":
+                worksheet.set_column(c, c, 12)
+        return worksheet
+
+    numero_aba = 1
+    worksheet = nova_aba(numero_aba)
+    linha_aba = 0
+    for inicio in range(0, len(df), tamanho_bloco):
+        bloco = df.iloc[inicio:inicio + tamanho_bloco]
+        vazios = bloco.isna().to_numpy()
+        for valores, vazios_linha in zip(bloco.itertuples(index=False, name=None), vazios):
+            if linha_aba == linhas_por_aba:
+                numero_aba += 1
+                worksheet = nova_aba(numero_aba)
+                linha_aba = 0
+            linha_aba += 1
+            for c, valor in enumerate(valores):
+                # Células vazias não são gravadas
+                if vazios_linha[c] or valor == "":
+                    continue
+                escritor = escritores[c]
+                if escritor == "numero":
+                    worksheet.write_number(linha_aba, c, valor)
+                elif escritor == "data" and isinstance(valor, (date, datetime)):
+                    worksheet.write_datetime(linha_aba, c, valor, formato_data)
+                else:
+                    worksheet.write_string(linha_aba, c, str(valor))
+
+    workbook.close()
+    return output.getvalue() if destino is None else None
@@ -0,0 +1,510 @@
+import zipfile
+from collections import namedtuple
+from datetime import date, datetime, timezone
+from io import BytesIO
+
+from parser_xml import obter_parser
+
+# Este módulo não importa Streamlit nem pandas: ele é carregado pelos
+# processos do motor paralelo e precisa ser leve e sem efeitos colaterais.
+
+# Aumente sempre que mudar as colunas ou os valores extraídos: o armazém de
+# documentos descarta o que foi guardado com outra versão.
+VERSAO_EXTRACAO = 5
+
+# Backend de XML (lxml quando instalado, senão a biblioteca padrão)
+PARSER = obter_parser()
+ERROS_XML = PARSER.erros
+
+# ===============================
+# Listar XMLs de um ZIP (sem extrair para o disco)
+# ===============================
+# Erros ao abrir um ZIP: corrompido, truncado, não é ZIP ou sumiu do disco
+ERROS_ZIP = (zipfile.BadZipFile, zipfile.LargeZipFile, OSError, EOFError)
+
+
+class ZipIlegivel:
+    """Ocupa o lugar de um ZIP que não abriu: `read` relança o erro, e o arquivo vai para a quarentena na leitura."""
+
+    def __init__(self, erro):
+        self.erro = erro
+
+    def read(self, membro):
+        raise self.erro
+
+
+def listar_xmls_de_zip(arquivo_zip, origem):
+    """Percorre o ZIP uma única vez e retorna (nome, zip, membro) de cada XML, inclusive de ZIPs aninhados.
+
+    Um ZIP que não abre (o próprio ou um aninhado) não interrompe a listagem: entra
+    como um único item cuja leitura falha, para ser registrado na quarentena.
+    """
+    try:
+        zip_ref = zipfile.ZipFile(arquivo_zip, 'r')
+        membros = zip_ref.infolist()
+    except ERROS_ZIP as e:
+        return [(origem, ZipIlegivel(e), "")]
+    xml_files = []
+    for info in membros:
+        if info.is_dir():
+            continue
+        nome = f"{origem}/{info.filename}"
+        if info.filename.lower().endswith('.zip'):
+            # ZIP dentro de ZIP: lido em memória, sem passar pelo disco
+            try:
+                conteudo = zip_ref.read(info)
+            except ERROS_ZIP as e:
+                xml_files.append((nome, ZipIlegivel(e), info))
+                continue
+            aninhados = listar_xmls_de_zip(BytesIO(conteudo), nome)
+            if len(aninhados) == 1 and isinstance(aninhados[0][1], ZipIlegivel):
+                # Registrado como membro do ZIP de fora (arquivo externo + caminho do .zip interno)
+                aninhados = [(nome, aninhados[0][1], info)]
+            xml_files.extend(aninhados)
+        elif info.filename.lower().endswith('.xml'):
+            xml_files.append((nome, zip_ref, info))
+    return xml_files
+
+# ===============================
+# Tipos das colunas (convertidos já na extração)
+# ===============================
+TEXTO = "texto"
+NUMERO = "numero"
+DATA = "data"
+
+# Valores "vazios" de número e data, compatíveis com NaN/NaT do pandas
+NUMERO_VAZIO = float("nan")
+DATA_VAZIA = -2 ** 63
+_EPOCA = date(1970, 1, 1)
+_NANOS_POR_DIA = 86_400 * 10 ** 9
+
+
+def converter_numero(texto):
+    """Valor monetário/alíquota do XML (ponto decimal) para float; vazio ou inválido vira NaN."""
+    if not texto:
+        return NUMERO_VAZIO
+    try:
+        return float(texto)
+    except ValueError:
+        return NUMERO_VAZIO
+
+
+def converter_data(texto):
+    """dhEmi para o dia da emissão (em UTC), em nanossegundos desde 1970, como o datetime64 do pandas."""
+    if not texto:
+        return DATA_VAZIA
+    try:
+        momento = datetime.fromisoformat(texto)
+    except ValueError:
+        return DATA_VAZIA
+    if momento.tzinfo is not None:
+        momento = momento.astimezone(timezone.utc)
+    return (momento.date() - _EPOCA).days * _NANOS_POR_DIA
+
+
+CONVERSORES = {
+    TEXTO: lambda texto: texto,
+    NUMERO: converter_numero,
+    DATA: converter_data,
+}
+
+# ===============================
+# Planos de extração (compilados uma vez, na importação)
+# ===============================
+# Cada layout é uma lista declarativa (coluna, caminho[, tipo]). Os caminhos partem do
+# nfeProc/cteProc e aceitam "*" (qualquer tag), "tag[1]" (só a primeira
+# ocorrência) e "a|b" (qualquer uma das tags). Uma tupla de caminhos é lida como
+# alternativas: vale o primeiro valor não vazio; nos obrigatórios, basta uma existir. O tipo (TEXTO, NUMERO ou DATA) define a conversão do texto;
+# sem tipo, a coluna fica como texto. Para acrescentar uma coluna, basta uma
+# linha na lista.
+class _No:
+    __slots__ = ("filhos", "curinga", "posicoes", "grupo")
+
+    def __init__(self):
+        self.filhos = {}
+        self.curinga = None
+        self.posicoes = []
+        self.grupo = None
+
+
+class PlanoExtracao:
+    """Árvore de tags que preenche todas as colunas de um layout numa única descida pelo XML."""
+
+    def __init__(self, namespace, campos, obrigatorios=(), grupo=None, obrigatorios_grupo=()):
+        self.namespace = namespace
+        campos = [(campo[0], campo[1], campo[2] if len(campo) > 2 else TEXTO) for campo in campos]
+        self.colunas = tuple(coluna for coluna, _, _ in campos)
+        self.tipos = tuple(tipo for _, _, tipo in campos)
+        self._conversores = [CONVERSORES[tipo] for tipo in self.tipos]
+        self.raiz = _No()
+        self.posicoes_colunas = []
+        self.posicoes_obrigatorias = []
+        self.tamanho = 0
+        # Colunas do grupo (ex.: det) viram uma linha por ocorrência do grupo
+        self.grupo = None
+        self.tag_grupo = None
+        if grupo is not None:
+            self.tag_grupo = f"{{{namespace}}}{grupo.rsplit('/', 1)[-1]}"
+            self.grupo = PlanoExtracao(namespace, [
+                (coluna, self._relativo(caminho, grupo), tipo)
+                for coluna, caminho, tipo in campos if self._no_grupo(caminho, grupo)
+            ], obrigatorios_grupo)
+            self._no(grupo).grupo = self.grupo
+
+        for coluna, caminhos, _ in campos:
+            if grupo is not None and self._no_grupo(caminhos, grupo):
+                self.posicoes_colunas.append(("grupo", self.grupo.colunas.index(coluna)))
+                continue
+            if isinstance(caminhos, str):
+                caminhos = (caminhos,)
+            self.posicoes_colunas.append(("documento", [self._registrar(caminho) for caminho in caminhos]))
+        self.posicoes_obrigatorias = [
+            [self._registrar(caminho) for caminho in ((caminhos,) if isinstance(caminhos, str) else caminhos)]
+            for caminhos in obrigatorios
+        ]
+
+    @staticmethod
+    def _no_grupo(caminhos, grupo):
+        caminho = caminhos if isinstance(caminhos, str) else caminhos[0]
+        return caminho.startswith(grupo + "/")
+
+    @staticmethod
+    def _relativo(caminhos, grupo):
+        if isinstance(caminhos, str):
+            return caminhos[len(grupo) + 1:]
+        return tuple(caminho[len(grupo) + 1:] for caminho in caminhos)
+
+    def _no(self, caminho):
+        no = self.raiz
+        for passo in caminho.split("/"):
+            if passo == "*":
+                if no.curinga is None:
+                    no.curinga = _No()
+                no = no.curinga
+                continue
+            primeiro = passo.endswith("[1]")
+            chaves = [(f"{{{self.namespace}}}{tag}", primeiro) for tag in (passo[:-3] if primeiro else passo).split("|")]
+            # Tags alternativas levam ao mesmo nó
+            proximo = next((no.filhos[chave] for chave in chaves if chave in no.filhos), None) or _No()
+            for chave in chaves:
+                no.filhos[chave] = proximo
+            no = proximo
+        return no
+
+    def _registrar(self, caminho):
+        self._no(caminho).posicoes.append(self.tamanho)
+        self.tamanho += 1
+        return self.tamanho - 1
+
+    def extrair(self, elemento, raiz_virtual=True, itens=None):
+        """Retorna as linhas (tuplas na ordem de `colunas`) extraídas de `elemento`.
+
+        Com `raiz_virtual`, o elemento pode ser tanto o nfeProc/cteProc quanto o
+        documento sem protocolo (NFe/CTe), que é tratado como filho de um proc vazio.
+        `itens` recebe as linhas do grupo já extraídas em fluxo (ver `extrair_em_fluxo`).
+        """
+        valores = [None] * self.tamanho
+        grupos = list(itens) if itens is not None else []
+        if raiz_virtual and (elemento.tag, False) in self.raiz.filhos:
+            _percorrer(self.raiz, (elemento,), valores, grupos)
+        else:
+            _percorrer(self.raiz, elemento, valores, grupos)
+
+        for posicoes in self.posicoes_obrigatorias:
+            if all(valores[posicao] is None for posicao in posicoes):
+                return []
+
+        documento = []
+        for (origem, posicoes), conversor in zip(self.posicoes_colunas, self._conversores):
+            if origem == "grupo":
+                documento.append(None)
+                continue
+            valor = ""
+            for posicao in posicoes:
+                if valores[posicao]:
+                    valor = valores[posicao]
+                    break
+            documento.append(conversor(valor))
+
+        if self.grupo is None:
+            return [tuple(documento)]
+
+        linhas = []
+        for item in grupos:
+            linhas.append(tuple(
+                item[posicoes] if origem == "grupo" else valor
+                for valor, (origem, posicoes) in zip(documento, self.posicoes_colunas)
+            ))
+        return linhas
+
+    def extrair_em_fluxo(self, arquivo, parser=None):
+        """Como `extrair`, mas lendo o XML com iterparse; retorna (raiz, linhas).
+
+        Cada ocorrência do grupo (det) vira linha assim que fecha e é retirada da
+        árvore, então a memória não cresce com a quantidade de itens. Os campos do
+        cabeçalho (emit, ide, transp, infProt) são lidos uma vez, no fim, da árvore
+        que sobrou, e repetidos em cada linha.
+        """
+        itens = []
+        raiz = (parser or PARSER).fluxo(
+            arquivo, self.tag_grupo,
+            lambda elemento: itens.extend(self.grupo.extrair(elemento, raiz_virtual=False))
+        )
+        return raiz, self.extrair(localizar_documento(raiz), itens=itens)
+
+
+def _percorrer(no, elementos, valores, grupos):
+    """Desce pelos filhos de `elementos` seguindo só os ramos que o plano usa."""
+    vistos = None
+    for elemento in elementos:
+        tag = elemento.tag
+        filho = no.filhos.get((tag, False))
+        if filho is not None:
+            _visitar(filho, elemento, valores, grupos)
+        primeiro = no.filhos.get((tag, True))
+        if primeiro is not None:
+            if vistos is None:
+                vistos = set()
+            if tag not in vistos:
+                vistos.add(tag)
+                _visitar(primeiro, elemento, valores, grupos)
+        if no.curinga is not None:
+            _visitar(no.curinga, elemento, valores, grupos)
+
+
+def _visitar(no, elemento, valores, grupos):
+    for posicao in no.posicoes:
+        if valores[posicao] is None:
+            valores[posicao] = elemento.text or ""
+    if no.grupo is not None:
+        linhas = no.grupo.extrair(elemento, raiz_virtual=False)
+        grupos.extend(linhas)
+    if no.filhos or no.curinga is not None:
+        _percorrer(no, elemento, valores, grupos)
+
+
+NFE = "http://www.portalfiscal.inf.br/nfe"
+CTE = "http://www.portalfiscal.inf.br/cte"
+
+# Raízes reconhecidas: o documento com e sem protocolo. O CTe OS (modelo 67) e o
+# CTe Simplificado têm o mesmo infCte do CTe, então usam os mesmos caminhos.
+DOCUMENTO_CTE = "CTe|CTeOS|CTeSimp"
+RAIZES_NFE = tuple(f"{{{NFE}}}{tag}" for tag in ("nfeProc", "NFe"))
+RAIZES_CTE = tuple(f"{{{CTE}}}{tag}" for tag in ("cteProc", "CTe", "cteOSProc", "CTeOS", "cteSimpProc", "CTeSimp"))
+RAIZES_EVENTO = tuple(f"{{{NFE}}}{tag}" for tag in ("procEventoNFe", "evento"))
+RAIZES = RAIZES_NFE + RAIZES_CTE + RAIZES_EVENTO
+
+
+def localizar_documento(root):
+    """O elemento do documento (nfeProc, CTe, evento...): a própria raiz ou, num XML
+    que embrulha o documento em outra tag, o primeiro reconhecido dentro dela."""
+    if root.tag in RAIZES:
+        return root
+    return next((elemento for elemento in root.iter() if elemento.tag in RAIZES), root)
+
+LAYOUT_CABECALHO = "Cabeçalho"
+LAYOUT_ITEM = "Item"
+LAYOUTS = (LAYOUT_CABECALHO, LAYOUT_ITEM)
+
+# ===============================
+# Layout NFe por item
+# ===============================
+PLANO_NFE_ITEM = PlanoExtracao(NFE, [
+    ("Número NFe", "NFe/infNFe/ide/nNF"),
+    ("Data de Emissão", "NFe/infNFe/ide/dhEmi", DATA),
+    ("CNPJ Emitente", "NFe/infNFe/emit/CNPJ"),
+    ("Emitente", "NFe/infNFe/emit/xNome"),
+    ("UF Emitente", "NFe/infNFe/emit/enderEmit/UF"),
+    ("Valor Total do Produto", "NFe/infNFe/det/prod/vProd", NUMERO),
+    ("ICMS", "NFe/infNFe/det/imposto/ICMS/*/vICMS", NUMERO),
+    ("Alíquota ICMS", "NFe/infNFe/det/imposto/ICMS/*/pICMS", NUMERO),
+    ("IPI", "NFe/infNFe/det/imposto/IPI/IPITrib/vIPI", NUMERO),
+    ("PIS", "NFe/infNFe/det/imposto/PIS/PISAliq/vPIS", NUMERO),
+    ("COFINS", "NFe/infNFe/det/imposto/COFINS/COFINSAliq/vCOFINS", NUMERO),
+    ("ICMS ST", "NFe/infNFe/det/imposto/ICMS/*/vICMSST", NUMERO),
+    ("Frete", "NFe/infNFe/transp/vFrete", NUMERO),
+    ("Seguro", "NFe/infNFe/transp/vSeg", NUMERO),
+    ("Chave de Acesso", "protNFe/infProt/chNFe"),
+    ("cBenef", "NFe/infNFe/det/prod/cBenef"),
+    ("ICMS Desonerado", "NFe/infNFe/det/imposto/ICMS/*/vICMSDeson", NUMERO),
+    ("CFOP", "NFe/infNFe/det/prod/CFOP"),
+    ("CST ICMS", "NFe/infNFe/det/imposto/ICMS/*/CST"),
+    ("Status da NFe", "protNFe/infProt/cStat"),
+], obrigatorios=("NFe/infNFe/emit", "NFe/infNFe/ide", "NFe/infNFe/total"),
+   grupo="NFe/infNFe/det", obrigatorios_grupo=("prod", "imposto"))
+
+
+# ===============================
+# Layout NFe por cabeçalho
+# ===============================
+# CFOP e CST/CSOSN vêm do primeiro item (det[1])
+PLANO_NFE_CABECALHO = PlanoExtracao(NFE, [
+    ("Chave de Acesso", "protNFe/infProt/chNFe"),
+    ("Número NFe", "NFe/infNFe/ide/nNF"),
+    ("Série", "NFe/infNFe/ide/serie"),
+    ("Modelo", "NFe/infNFe/ide/mod"),
+    ("Data de Emissão", "NFe/infNFe/ide/dhEmi", DATA),
+    ("CNPJ Emitente", "NFe/infNFe/emit/CNPJ"),
+    ("Emitente", "NFe/infNFe/emit/xNome"),
+    ("UF Emitente", "NFe/infNFe/emit/enderEmit/UF"),
+    ("CFOP", "NFe/infNFe/det[1]/prod/CFOP"),
+    ("Valor da Nota", "NFe/infNFe/total/ICMSTot/vNF", NUMERO),
+    # Simples Nacional usa CSOSN; no regime normal vale o CST
+    ("CST/CSOSN", ("NFe/infNFe/det[1]/imposto/ICMS/*/CSOSN", "NFe/infNFe/det[1]/imposto/*/*/CST")),
+    ("ICMS", "NFe/infNFe/total/ICMSTot/vICMS", NUMERO),
+    ("IPI", "NFe/infNFe/total/ICMSTot/vIPI", NUMERO),
+    ("PIS", "NFe/infNFe/total/ICMSTot/vPIS", NUMERO),
+    ("COFINS", "NFe/infNFe/total/ICMSTot/vCOFINS", NUMERO),
+    ("ICMS ST", "NFe/infNFe/total/ICMSTot/vST", NUMERO),
+    ("Frete", "NFe/infNFe/transp/vFrete", NUMERO),
+    ("Seguro", "NFe/infNFe/transp/vSeg", NUMERO),
+    ("ICMS Desonerado", "NFe/infNFe/total/ICMSTot/vICMSDeson", NUMERO),
+    ("Status da NFe", "protNFe/infProt/cStat"),
+], obrigatorios=("NFe/infNFe/emit", "NFe/infNFe/ide", "NFe/infNFe/total"))
+
+
+def processar_nfe_por_cabecalho(root):
+    return PLANO_NFE_CABECALHO.extrair(root)
+
+# ===============================
+# Layout CTe
+# ===============================
+# O CTe Simplificado traz o valor da prestação em total/vTPrest
+PLANO_CTE = PlanoExtracao(CTE, [
+    ("Número CTe", f"{DOCUMENTO_CTE}/infCte/ide/nCT"),
+    ("Data de Emissão", f"{DOCUMENTO_CTE}/infCte/ide/dhEmi", DATA),
+    ("CNPJ Emitente", f"{DOCUMENTO_CTE}/infCte/emit/CNPJ"),
+    ("Emitente", f"{DOCUMENTO_CTE}/infCte/emit/xNome"),
+    ("UF Emitente", f"{DOCUMENTO_CTE}/infCte/emit/enderEmit/UF"),
+    ("Valor Total", (f"{DOCUMENTO_CTE}/infCte/vPrest/vTPrest", f"{DOCUMENTO_CTE}/infCte/total/vTPrest"), NUMERO),
+    ("ICMS", f"{DOCUMENTO_CTE}/infCte/imp/ICMS/ICMS00/vICMS", NUMERO),
+    ("Chave de Acesso", "protCTe/infProt/chCTe"),
+], obrigatorios=(
+    f"{DOCUMENTO_CTE}/infCte/ide", f"{DOCUMENTO_CTE}/infCte/emit",
+    (f"{DOCUMENTO_CTE}/infCte/vPrest/vTPrest", f"{DOCUMENTO_CTE}/infCte/total/vTPrest"), "protCTe/infProt/chCTe",
+))
+
+
+def processar_cte(root):
+    return PLANO_CTE.extrair(root)
+
+
+# Tipo de cada coluna, usado para montar os buffers por coluna fora dos workers
+TIPO_DAS_COLUNAS = {
+    coluna: tipo
+    for plano in (PLANO_NFE_ITEM, PLANO_NFE_CABECALHO, PLANO_CTE)
+    for coluna, tipo in zip(plano.colunas, plano.tipos)
+}
+
+# ===============================
+# Identificação do documento (para o índice de chaves)
+# ===============================
+NS_NFE = {'ns': NFE}
+NS_CTE = {'ns': CTE}
+
+# O que o índice de chaves precisa saber de cada XML, além das linhas:
+# - chave: chave de acesso da NFe/CTe (None em eventos)
+# - autorizado: tem protocolo de autorização (nfeProc/cteProc com cStat 100 ou 150)
+# - recebimento: dhRecbto do protocolo em segundos desde 1970 (None sem protocolo)
+# - eventos: ((chave, tpEvento), ...) de um XML de evento
+# - referencias: chaves das NFe transportadas por um CTe (infCTeNorm/infDoc/infNFe/chave)
+InfoDocumento = namedtuple("InfoDocumento", ["chave", "autorizado", "recebimento", "eventos", "referencias"])
+INFO_VAZIA = InfoDocumento(None, False, None, (), ())
+
+STATUS_AUTORIZADO = ("100", "150")
+# Modelo do documento, nas posições 21-22 da chave de acesso
+MODELOS = {"55": "NFe", "65": "NFCe", "57": "CTe", "67": "CTe OS"}
+
+
+def _texto(elemento, caminho, ns):
+    encontrado = elemento.find(caminho, ns)
+    return encontrado.text.strip() if encontrado is not None and encontrado.text else None
+
+
+def _segundos(texto):
+    try:
+        return datetime.fromisoformat(texto).timestamp() if texto else None
+    except ValueError:
+        return None
+
+
+def _info_autorizado(root, caminho_inf, caminho_prot, tag_chave, ns):
+    """Chave, autorização e recebimento de uma NFe/CTe (com ou sem o protocolo)."""
+    prot = root.find(caminho_prot, ns)
+    chave = _texto(prot, tag_chave, ns) if prot is not None else None
+    if chave is None:
+        # Sem protocolo: a chave está no Id do infNFe/infCte ("NFe" + 44 dígitos)
+        inf = root.find(caminho_inf, ns)
+        identificador = inf.get('Id') if inf is not None else None
+        chave = identificador[3:] if identificador else None
+    if prot is None:
+        return chave, False, None
+    return chave, _texto(prot, 'ns:cStat', ns) in STATUS_AUTORIZADO, _segundos(_texto(prot, 'ns:dhRecbto', ns))
+
+
+def informacoes_documento(root):
+    """InfoDocumento de qualquer XML lido (NFe, CTe ou evento de NFe)."""
+    tag = root.tag
+    if tag in RAIZES_EVENTO:
+        caminho = 'ns:evento/ns:infEvento' if tag.endswith('procEventoNFe') else 'ns:infEvento'
+        eventos = []
+        for inf_evento in root.iterfind(caminho, NS_NFE):
+            ch_nfe = _texto(inf_evento, 'ns:chNFe', NS_NFE)
+            tp_evento = _texto(inf_evento, 'ns:tpEvento', NS_NFE)
+            if ch_nfe and tp_evento:
+                eventos.append((ch_nfe, tp_evento))
+        return INFO_VAZIA._replace(eventos=tuple(eventos))
+    if tag in RAIZES_CTE:
+        chave, autorizado, recebimento = _info_autorizado(root, './/ns:infCte', 'ns:protCTe/ns:infProt', 'ns:chCTe', NS_CTE)
+        referencias = tuple(
+            elemento.text.strip()
+            for elemento in root.iterfind('.//ns:infCTeNorm/ns:infDoc/ns:infNFe/ns:chave', NS_CTE)
+            if elemento.text
+        )
+        return InfoDocumento(chave, autorizado, recebimento, (), referencias)
+    if tag in RAIZES_NFE:
+        chave, autorizado, recebimento = _info_autorizado(root, './/ns:infNFe', 'ns:protNFe/ns:infProt', 'ns:chNFe', NS_NFE)
+        return InfoDocumento(chave, autorizado, recebimento, (), ())
+    return INFO_VAZIA
+
+
+def tipo_documento(info):
+    """Nome do tipo do XML ("NFe", "NFCe", "CTe", "evento"...), para relatórios."""
+    if info.eventos:
+        return "evento"
+    return MODELOS.get(info.chave[20:22], "outro") if info.chave else "outro"
+
+
+# ===============================
+# Classificar XML (leitura única)
+# ===============================
+
+
+def classificar_xml(conteudo, tipo_doc, layout=LAYOUT_CABECALHO, parser=None):
+    """Lê o XML uma única vez e retorna (colunas, linhas extraídas, InfoDocumento).
+
+    NFe por item é lida em fluxo (iterparse), para que notas com milhares de itens
+    não montem a árvore inteira na memória. Eventos e documentos do outro tipo
+    (ex.: um CTe num ZIP de NFe) não geram linhas, mas entram no índice de chaves.
+    Não trata ERROS_XML: quem chama decide como registrar o erro.
+    """
+    parser = parser or PARSER
+    if tipo_doc == "NFe" and layout == LAYOUT_ITEM:
+        root, linhas = PLANO_NFE_ITEM.extrair_em_fluxo(BytesIO(conteudo), parser)
+        root = localizar_documento(root)
+        info = informacoes_documento(root)
+        if info.eventos or root.tag.startswith('{' + CTE):
+            return None, [], info
+        return PLANO_NFE_ITEM.colunas, linhas, info
+
+    root = localizar_documento(parser.fromstring(conteudo))
+    info = informacoes_documento(root)
+
+    if info.eventos:
+        return None, [], info
+
+    if tipo_doc == "NFe":
+        if root.tag.startswith('{' + CTE):
+            return None, [], info
+        return PLANO_NFE_CABECALHO.colunas, processar_nfe_por_cabecalho(root), info
+    return PLANO_CTE.colunas, processar_cte(root), info
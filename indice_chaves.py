@@ -0,0 +1,106 @@
+import os
+
+# Regra para escolher, entre XMLs com a mesma chave de acesso, qual fica na planilha:
+# - "autorizada": o nfeProc/cteProc autorizado vence o XML sem protocolo; entre iguais, o recebido por último
+# - "recente": o de dhRecbto mais recente, com ou sem autorização
+REGRA_AUTORIZADA = "autorizada"
+REGRA_RECENTE = "recente"
+REGRAS_DUPLICADOS = (REGRA_AUTORIZADA, REGRA_RECENTE)
+REGRA_PADRAO = os.environ.get("LEITOR_XML_DUPLICADOS", REGRA_AUTORIZADA)
+
+TP_CANCELAMENTO = "110111"
+DESCRICOES_EVENTOS = {
+    "110110": "Carta de Correção",
+    "110111": "Cancelamento",
+    "110140": "EPEC",
+    "210200": "Confirmação da Operação",
+    "210210": "Ciência da Operação",
+    "210220": "Desconhecimento da Operação",
+    "210240": "Operação não Realizada",
+}
+
+_SEM_RECEBIMENTO = float("-inf")
+
+
+class IndiceChaves:
+    """Índice por chave de acesso: descarta XMLs repetidos e liga documentos relacionados.
+
+    Tudo fica em dicionários (busca O(1) por chave, mesmo com milhões de chaves):
+    - documentos: chave -> (autorizado, recebimento, inicio, fim), as linhas do XML que ficou;
+    - eventos: chave -> {tpEvento};
+    - referencias: chave da NFe -> [chaves dos CTe que a transportam] (e o inverso).
+    As linhas dos XMLs descartados ficam em `descartados`, como intervalos (inicio, fim).
+    """
+
+    __slots__ = ("regra", "documentos", "descartados", "eventos", "ctes_da_nfe", "nfes_do_cte")
+
+    def __init__(self, regra=REGRA_PADRAO):
+        if regra not in REGRAS_DUPLICADOS:
+            raise ValueError(f"Regra de duplicados desconhecida: {regra!r} (use {', '.join(REGRAS_DUPLICADOS)})")
+        self.regra = regra
+        self.documentos = {}
+        self.descartados = []
+        self.eventos = {}
+        self.ctes_da_nfe = {}
+        self.nfes_do_cte = {}
+
+    def _prefere(self, novo, atual):
+        """True se o documento `novo` deve substituir o `atual` (empate: fica o primeiro visto)."""
+        if self.regra == REGRA_AUTORIZADA and novo[0] != atual[0]:
+            return novo[0]
+        return (novo[1] or _SEM_RECEBIMENTO) > (atual[1] or _SEM_RECEBIMENTO)
+
+    def adicionar(self, info, inicio=0, fim=0):
+        """Indexa um InfoDocumento cujas linhas ocupam [inicio, fim) na tabela."""
+        for chave, tp_evento in info.eventos:
+            self.eventos.setdefault(chave, set()).add(tp_evento)
+        if info.chave is None:
+            return
+        if info.referencias:
+            self.nfes_do_cte[info.chave] = info.referencias
+            for chave_nfe in info.referencias:
+                ctes = self.ctes_da_nfe.setdefault(chave_nfe, [])
+                if info.chave not in ctes:
+                    ctes.append(info.chave)
+        novo = (info.autorizado, info.recebimento, inicio, fim)
+        atual = self.documentos.get(info.chave)
+        if atual is None:
+            self.documentos[info.chave] = novo
+        elif self._prefere(novo, atual):
+            self.documentos[info.chave] = novo
+            self.descartados.append((atual[2], atual[3]))
+        else:
+            self.descartados.append((inicio, fim))
+
+    def adicionar_documentos(self, documentos, deslocamento=0):
+        """Indexa uma lista de (InfoDocumento, inicio, fim), somando `deslocamento` às linhas."""
+        for info, inicio, fim in documentos:
+            self.adicionar(info, inicio + deslocamento, fim + deslocamento)
+
+    @property
+    def linhas_duplicadas(self):
+        return sum(fim - inicio for inicio, fim in self.descartados)
+
+    def canceladas(self):
+        return {chave for chave, tipos in self.eventos.items() if TP_CANCELAMENTO in tipos}
+
+    def descricao_eventos(self, eventos_extra=None):
+        """{chave: "Carta de Correção, ..."} com os eventos de cada nota, exceto o cancelamento (que vira a Situação)."""
+        todos = dict(self.eventos)
+        for chave, tipos in (eventos_extra or {}).items():
+            todos[chave] = todos.get(chave, set()) | set(tipos)
+        descricoes = {}
+        for chave, tipos in todos.items():
+            nomes = sorted(DESCRICOES_EVENTOS.get(tipo, tipo) for tipo in tipos if tipo != TP_CANCELAMENTO)
+            if nomes:
+                descricoes[chave] = ", ".join(nomes)
+        return descricoes
+
+    def colunas_de_vinculo(self, tipo_doc, eventos_extra=None):
+        """Colunas extras ligadas pela chave de acesso: {coluna: {chave: texto}}."""
+        if tipo_doc == "CTe":
+            return {"NFe Referenciadas": {chave: ", ".join(nfes) for chave, nfes in self.nfes_do_cte.items()}}
+        return {
+            "Eventos": self.descricao_eventos(eventos_extra),
+            "CTe Vinculados": {chave: ", ".join(ctes) for chave, ctes in self.ctes_da_nfe.items()},
+        }
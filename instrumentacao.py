@@ -0,0 +1,90 @@
+import json
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Intervalo mínimo (em segundos) entre duas atualizações da barra de progresso
+INTERVALO_PROGRESSO = 0.25
+
+
+class Instrumentacao:
+    """Tempo de cada etapa e contadores (documentos, bytes, falhas) de uma execução.
+
+    Barata o bastante para ficar sempre ligada: só soma `perf_counter` por etapa.
+    Tempos medidos nos workers chegam já somados por lote (`somar`), então
+    representam tempo de CPU somado entre os processos, não tempo de relógio.
+    """
+
+    def __init__(self):
+        self.inicio = datetime.now()
+        self.etapas = {}
+        self.contadores = {}
+
+    def registrar(self, etapa, segundos, quantidade=0):
+        registro = self.etapas.setdefault(etapa, {"segundos": 0.0, "chamadas": 0, "quantidade": 0})
+        registro["segundos"] += segundos
+        registro["chamadas"] += 1
+        registro["quantidade"] += quantidade
+
+    @contextmanager
+    def etapa(self, nome, quantidade=0):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(nome, time.perf_counter() - inicio, quantidade)
+
+    def contar(self, nome, quantidade=1):
+        self.contadores[nome] = self.contadores.get(nome, 0) + quantidade
+
+    def somar(self, tempos):
+        """Acrescenta um dicionário {etapa: (segundos, quantidade)} vindo de um worker."""
+        for etapa, (segundos, quantidade) in (tempos or {}).items():
+            self.registrar(etapa, segundos, quantidade)
+
+    def resumo(self):
+        """Uma linha por etapa: tempo total, chamadas, itens processados e itens por segundo."""
+        return [
+            {
+                "Etapa": etapa,
+                "Tempo (s)": round(registro["segundos"], 3),
+                "Chamadas": registro["chamadas"],
+                "Quantidade": registro["quantidade"],
+                "Por segundo": round(registro["quantidade"] / registro["segundos"], 1)
+                if registro["quantidade"] and registro["segundos"] else None,
+            }
+            for etapa, registro in self.etapas.items()
+        ]
+
+    def para_json(self):
+        """Log estruturado da execução, para anexar a um chamado ou comparar entre clientes."""
+        return json.dumps({
+            "inicio": self.inicio.isoformat(timespec="seconds"),
+            "etapas": self.etapas,
+            "contadores": self.contadores,
+        }, ensure_ascii=False, indent=2)
+
+
+def medir_documento(tempos, etapa, inicio):
+    """Acumula em `tempos` ({etapa: (segundos, quantidade)}) um documento iniciado em `inicio`."""
+    segundos, quantidade = tempos.get(etapa, (0.0, 0))
+    tempos[etapa] = (segundos + time.perf_counter() - inicio, quantidade + 1)
+
+
+class ProgressoLimitado:
+    """Repassa `(feitos, total)` para `atualizar` no máximo a cada `intervalo` segundos.
+
+    Atualizar a barra do Streamlit a cada arquivo custa caro com dezenas de
+    milhares de XMLs; a última atualização (feitos == total) sempre passa.
+    """
+
+    def __init__(self, atualizar, intervalo=INTERVALO_PROGRESSO):
+        self.atualizar = atualizar
+        self.intervalo = intervalo
+        self._ultima = 0.0
+
+    def __call__(self, feitos, total):
+        agora = time.monotonic()
+        if feitos >= total or agora - self._ultima >= self.intervalo:
+            self._ultima = agora
+            self.atualizar(feitos, total)
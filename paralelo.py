@@ -0,0 +1,360 @@
+import os
+import time
+import zipfile
+import queue
+import hashlib
+import threading
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, Future
+
+from extratores import classificar_xml, tipo_documento, ERROS_XML, LAYOUT_CABECALHO
+from quarentena import (
+    rejeitar, pre_verificar, PRE_VERIFICACAO_PADRAO, ETAPA_LEITURA, ETAPA_PRE_VERIFICACAO, ETAPA_PARSE, ETAPA_EXTRACAO
+)
+from tabela import TabelaColunar
+from instrumentacao import medir_documento
+
+TAMANHO_LOTE_PADRAO = 256
+# Estimativa por XML das entradas de `documentos` e da quarentena (tuplas pequenas com a chave de acesso)
+BYTES_POR_DOCUMENTO = 512
+
+# Resultado compacto devolvido por cada worker: as linhas vão como tuplas
+# (na ordem de `colunas`), como saem dos planos de extração.
+# `documentos` tem um (nome, linhas, InfoDocumento, erro) por XML, na ordem do lote;
+# `erro` é None ou o DocumentoRejeitado que vai para a quarentena.
+# `tempos` soma o tempo de análise por tipo de documento: {etapa: (segundos, quantidade)}.
+ResultadoLote = namedtuple("ResultadoLote", ["indice", "colunas", "documentos", "tempos"], defaults=(None,))
+
+
+# ===============================
+# Trabalho executado em cada processo
+# ===============================
+def processar_lote(indice, tipo_doc, layout, arquivos):
+    """Extrai um lote de (nome, membro, conteúdo) e devolve um ResultadoLote.
+
+    Qualquer erro em um XML (não só de sintaxe) o coloca na quarentena; o lote continua.
+    """
+    colunas = None
+    documentos = []
+    tempos = {}
+    for nome, membro, conteudo in arquivos:
+        inicio = time.perf_counter()
+        try:
+            colunas_documento, linhas, info = classificar_xml(conteudo, tipo_doc, layout)
+        except ERROS_XML as e:
+            medir_documento(tempos, "análise (falha)", inicio)
+            documentos.append((nome, [], None, rejeitar(nome, membro, ETAPA_PARSE, e)))
+            continue
+        except Exception as e:
+            medir_documento(tempos, "análise (falha)", inicio)
+            documentos.append((nome, [], None, rejeitar(nome, membro, ETAPA_EXTRACAO, e)))
+            continue
+        medir_documento(tempos, f"análise {tipo_documento(info)}", inicio)
+        if linhas and colunas is None:
+            colunas = colunas_documento
+        documentos.append((nome, linhas, info, None))
+    return ResultadoLote(indice, colunas, documentos, tempos)
+
+
+# ===============================
+# Motor paralelo
+# ===============================
+def gerar_lotes(xml_files, tamanho_lote, instrumentacao=None, pre_verificacao=False):
+    """Lê o conteúdo dos membros do ZIP e agrupa em lotes de até `tamanho_lote` arquivos.
+
+    Gera (lote, rejeitados): o lote tem (nome, membro, conteúdo) dos XMLs a analisar e
+    `rejeitados` os DocumentoRejeitado de quem não pôde ser lido ou, com `pre_verificacao`,
+    não tem cara de NFe/CTe (esses não chegam aos workers).
+    """
+    lote = []
+    rejeitados = []
+    for nome, zip_ref, info in xml_files:
+        membro = info.filename if isinstance(info, zipfile.ZipInfo) else ""
+        inicio = time.perf_counter()
+        try:
+            conteudo = zip_ref.read(info)
+        except Exception as e:
+            # ZIP corrompido (CRC, compressão desconhecida...) ou arquivo sumiu do disco
+            rejeitados.append(rejeitar(nome, membro, ETAPA_LEITURA, e))
+            conteudo = None
+        if instrumentacao is not None:
+            instrumentacao.registrar("descompactar", time.perf_counter() - inicio, 1)
+            instrumentacao.contar("bytes lidos", len(conteudo or b""))
+        if conteudo is not None:
+            motivo = pre_verificar(conteudo) if pre_verificacao else None
+            if motivo is None:
+                lote.append((nome, membro, conteudo))
+            else:
+                rejeitados.append(rejeitar(nome, membro, ETAPA_PRE_VERIFICACAO, motivo))
+        if len(lote) + len(rejeitados) == tamanho_lote:
+            yield lote, rejeitados
+            lote = []
+            rejeitados = []
+    if lote or rejeitados:
+        yield lote, rejeitados
+
+
+def consultar_armazem(lote, tipo_doc, layout, armazem, instrumentacao=None):
+    """Separa o lote entre documentos já guardados no armazém e os que ainda precisam ser analisados.
+
+    Retorna (hashes, salvos, faltando); sem armazém, todos os arquivos ficam em `faltando`.
+    """
+    if armazem is None:
+        return [None] * len(lote), {}, lote
+    inicio = time.perf_counter()
+    hashes = [hashlib.sha256(conteudo).hexdigest() for _, _, conteudo in lote]
+    salvos = armazem.buscar(hashes, tipo_doc, layout)
+    if instrumentacao is not None:
+        instrumentacao.registrar("armazém (consulta)", time.perf_counter() - inicio, len(lote))
+    faltando = [arquivo for arquivo, sha256 in zip(lote, hashes) if sha256 not in salvos]
+    return hashes, salvos, faltando
+
+
+def combinar_lote(indice, nomes, hashes, salvos, resultado, tipo_doc, layout, armazem, instrumentacao=None, rejeitados=()):
+    """Junta os documentos do armazém com os recém-analisados (na ordem do lote) e guarda os novos.
+
+    Os `rejeitados` antes da análise (leitura, pré-verificação) entram no fim do lote, sem linhas.
+    """
+    colunas = resultado.colunas if resultado is not None else None
+    novos = iter(resultado.documentos if resultado is not None else ())
+    documentos = []
+    para_guardar = []
+    for nome, sha256 in zip(nomes, hashes):
+        if sha256 in salvos:
+            colunas_salvas, linhas, info = salvos[sha256]
+            colunas = colunas or colunas_salvas
+            documentos.append((nome, linhas, info, None))
+            continue
+        documento = next(novos)
+        documentos.append(documento)
+        if armazem is not None and documento[3] is None:
+            para_guardar.append((sha256, resultado.colunas, documento[1], documento[2]))
+    documentos.extend((rejeitado.arquivo, [], None, rejeitado) for rejeitado in rejeitados)
+    if para_guardar:
+        inicio = time.perf_counter()
+        armazem.guardar(tipo_doc, layout, para_guardar)
+        if instrumentacao is not None:
+            instrumentacao.registrar("armazém (gravação)", time.perf_counter() - inicio, len(para_guardar))
+    if instrumentacao is not None:
+        instrumentacao.somar(resultado.tempos if resultado is not None else None)
+        instrumentacao.contar("documentos", len(documentos))
+        instrumentacao.contar("documentos do armazém", len(salvos))
+        instrumentacao.contar("falhas de análise", sum(1 for documento in documentos if documento[3] is not None))
+    return ResultadoLote(indice, colunas, documentos)
+
+
+def processar_em_paralelo(xml_files, tipo_doc, layout=LAYOUT_CABECALHO, workers=None, tamanho_lote=TAMANHO_LOTE_PADRAO, ao_progredir=None, armazem=None, instrumentacao=None, pre_verificacao=PRE_VERIFICACAO_PADRAO):
+    """Distribui os XMLs em lotes entre processos e devolve os ResultadoLote na ordem dos arquivos.
+
+    `ao_progredir(processados, total)` é chamado no processo principal a cada lote concluído.
+    É o pipeline em fluxo com uma única fonte; veja `executar_pipeline`.
+    """
+    resultados = []
+    for evento in executar_pipeline(
+        [(None, xml_files)], tipo_doc, layout, workers, tamanho_lote, armazem, instrumentacao, pre_verificacao
+    ):
+        if isinstance(evento, LoteConcluido):
+            resultados.append(evento.resultado)
+            if ao_progredir:
+                ao_progredir(evento.processados, evento.total)
+    return resultados
+
+
+# ===============================
+# Pipeline em fluxo
+# ===============================
+# As etapas são ligadas por filas limitadas: quando uma etapa atrasa, as anteriores
+# esperam (backpressure) em vez de acumular XMLs na memória.
+#   leitura dos membros (thread) -> triagem no armazém (thread) -> workers (processos)
+#   -> agrupador (o próprio gerador, no processo principal) -> quem consome os eventos
+# O agrupador devolve cada lote assim que fica pronto e cada fonte (ZIP/pasta)
+# completa, sempre na ordem de envio; com várias fontes, a leitura da próxima
+# acontece enquanto os workers ainda analisam a anterior.
+LoteConcluido = namedtuple("LoteConcluido", ["fonte", "resultado", "processados", "total"])
+FonteConcluida = namedtuple("FonteConcluida", ["fonte", "quantidade", "extraido"])
+
+# Intervalo (em segundos) em que uma etapa bloqueada confere se o pipeline foi interrompido
+ESPERA_FILA = 0.1
+
+
+class _Interrompido(Exception):
+    """O consumidor parou de ler os eventos: as threads encerram sem terminar as fontes."""
+
+
+def _colocar(fila, item, parar):
+    while not parar.is_set():
+        try:
+            fila.put(item, timeout=ESPERA_FILA)
+            return
+        except queue.Full:
+            pass
+    raise _Interrompido
+
+
+def _retirar(fila, parar):
+    while not parar.is_set():
+        try:
+            return fila.get(timeout=ESPERA_FILA)
+        except queue.Empty:
+            pass
+    raise _Interrompido
+
+
+def _reservar(vagas, parar):
+    while not parar.is_set():
+        if vagas.acquire(timeout=ESPERA_FILA):
+            return
+    raise _Interrompido
+
+
+def _iniciar_etapa(nome, etapa, saida, parar):
+    """Roda `etapa` em uma thread; uma exceção segue pela fila `saida` e é relançada pelo agrupador."""
+    def rodar():
+        try:
+            etapa()
+        except _Interrompido:
+            pass
+        except BaseException as e:
+            try:
+                _colocar(saida, ("erro", e), parar)
+            except _Interrompido:
+                pass
+
+    thread = threading.Thread(target=rodar, name=f"pipeline-{nome}", daemon=True)
+    thread.start()
+    return thread
+
+
+def executar_pipeline(fontes, tipo_doc, layout=LAYOUT_CABECALHO, workers=None, tamanho_lote=TAMANHO_LOTE_PADRAO, armazem=None, instrumentacao=None, pre_verificacao=PRE_VERIFICACAO_PADRAO):
+    """Extrai várias fontes em um único pipeline e gera os eventos conforme ficam prontos.
+
+    `fontes` é uma lista de (identificador, xml_files), com `xml_files` como o de
+    `listar_xmls_de_zip` ou uma função que o devolve, chamada só quando a leitura
+    chega à fonte (assim não ficam milhares de ZIPs abertos; essas fontes não entram
+    no `total` do progresso). Gera um LoteConcluido a cada lote (com o progresso geral)
+    e um FonteConcluida, com o (tabela, documentos, erros) de `juntar_resultados`,
+    quando todos os lotes de uma fonte terminam. Com um único worker (ou um único
+    lote) não há processos: a análise roda na thread de triagem. No máximo
+    2 lotes por worker ficam em voo, o que limita a memória a poucos lotes de XMLs.
+    """
+    fontes = list(fontes)
+    total = sum(len(xml_files) for _, xml_files in fontes if not callable(xml_files))
+    workers = workers or os.cpu_count() or 1
+    usar_processos = workers > 1 and (total > tamanho_lote or any(callable(xml_files) for _, xml_files in fontes))
+    em_voo = workers * 2 if usar_processos else 2
+    lidos = queue.Queue(em_voo)
+    triados = queue.Queue(em_voo)
+    vagas = threading.Semaphore(em_voo)
+    parar = threading.Event()
+    executor = None
+    if usar_processos:
+        # "spawn" evita herdar as threads do servidor Streamlit via fork
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+    # Cada etapa registra na instrumentação só as suas próprias etapas e contadores
+    def ler():
+        for fonte, xml_files in fontes:
+            if callable(xml_files):
+                xml_files = xml_files()
+            lotes = gerar_lotes(xml_files, tamanho_lote, instrumentacao, pre_verificacao)
+            for indice, (lote, rejeitados) in enumerate(lotes):
+                _colocar(lidos, ("lote", fonte, indice, lote, rejeitados), parar)
+            _colocar(lidos, ("fonte", fonte, len(xml_files)), parar)
+        _colocar(lidos, ("fim",), parar)
+
+    def analisar(indice, faltando):
+        if executor is not None:
+            return executor.submit(processar_lote, indice, tipo_doc, layout, faltando)
+        futuro = Future()
+        try:
+            futuro.set_result(processar_lote(indice, tipo_doc, layout, faltando))
+        except Exception as e:
+            futuro.set_exception(e)
+        return futuro
+
+    def triar():
+        while True:
+            item = _retirar(lidos, parar)
+            if item[0] == "lote":
+                _, fonte, indice, lote, rejeitados = item
+                hashes, salvos, faltando = consultar_armazem(lote, tipo_doc, layout, armazem, instrumentacao)
+                # Sem futuro quando o lote inteiro já estava no armazém: não passa pelos workers
+                futuro = None
+                if faltando:
+                    _reservar(vagas, parar)
+                    futuro = analisar(indice, faltando)
+                item = ("lote", fonte, indice, [nome for nome, _, _ in lote], hashes, salvos, futuro, rejeitados)
+            _colocar(triados, item, parar)
+            if item[0] in ("fim", "erro"):
+                return
+
+    threads = [_iniciar_etapa("leitura", ler, lidos, parar), _iniciar_etapa("triagem", triar, triados, parar)]
+    processados = 0
+    resultados = []
+    try:
+        while True:
+            item = triados.get()
+            if item[0] == "erro":
+                raise item[1]
+            if item[0] == "fim":
+                return
+            if item[0] == "fonte":
+                _, fonte, quantidade = item
+                inicio = time.perf_counter()
+                extraido = juntar_resultados(resultados)
+                if instrumentacao is not None:
+                    instrumentacao.registrar("juntar lotes", time.perf_counter() - inicio, quantidade)
+                resultados = []
+                yield FonteConcluida(fonte, quantidade, extraido)
+                continue
+            _, fonte, indice, nomes, hashes, salvos, futuro, rejeitados = item
+            resultado = None
+            if futuro is not None:
+                try:
+                    resultado = futuro.result()
+                finally:
+                    vagas.release()
+            resultado = combinar_lote(
+                indice, nomes, hashes, salvos, resultado, tipo_doc, layout, armazem, instrumentacao, rejeitados
+            )
+            resultados.append(resultado)
+            processados += len(resultado.documentos)
+            yield LoteConcluido(fonte, resultado, processados, total)
+    finally:
+        parar.set()
+        for thread in threads:
+            thread.join()
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def juntar_resultados(resultados):
+    """Concatena os lotes: retorna (TabelaColunar ou None, documentos, erros).
+
+    `erros` é a quarentena: um DocumentoRejeitado por XML que ficou de fora.
+    `documentos` tem um (InfoDocumento, inicio, fim) por XML lido, com o intervalo
+    das suas linhas na tabela; é o que alimenta o índice de chaves.
+    """
+    colunas = None
+    linhas = []
+    documentos = []
+    erros = []
+    for resultado in resultados:
+        if colunas is None:
+            colunas = resultado.colunas
+        for nome, linhas_documento, info, erro in resultado.documentos:
+            if erro is not None:
+                erros.append(erro)
+                continue
+            documentos.append((info, len(linhas), len(linhas) + len(linhas_documento)))
+            linhas.extend(linhas_documento)
+    tabela = TabelaColunar.de_linhas(colunas, linhas) if linhas else None
+    return tabela, documentos, erros
+
+
+def bytes_estimados(extraido):
+    """Memória aproximada de um (tabela, documentos, erros): os buffers da tabela mais um valor fixo por XML."""
+    tabela, documentos, erros = extraido
+    tamanho = tabela.bytes_estimados() if tabela is not None else 0
+    return tamanho + BYTES_POR_DOCUMENTO * (len(documentos) + len(erros))
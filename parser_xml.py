@@ -0,0 +1,76 @@
+import os
+import xml.etree.ElementTree as ET
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:  # lxml é opcional
+    lxml_etree = None
+
+# Força um backend ("lxml" ou "stdlib"); sem a variável, usa lxml se estiver instalado
+BACKEND_PADRAO = os.environ.get("LEITOR_XML_PARSER", "")
+
+
+# ===============================
+# Backends de leitura de XML
+# ===============================
+# Os extratores só usam fromstring/fluxo e a API comum de Element
+# (tag, text, iteração nos filhos, find, remove), então trocam de backend
+# sem mudança de código.
+class ParserStdlib:
+    nome = "stdlib"
+    erros = (ET.ParseError,)
+
+    def fromstring(self, conteudo):
+        return ET.fromstring(conteudo)
+
+    def fluxo(self, arquivo, tag, ao_fechar):
+        """Lê em fluxo chamando `ao_fechar(elemento)` a cada `tag` fechada, que depois sai da árvore.
+
+        Retorna a raiz com o que sobrou do documento.
+        """
+        raiz = None
+        pilha = []
+        for evento, elemento in ET.iterparse(arquivo, events=("start", "end")):
+            if evento == "start":
+                if raiz is None:
+                    raiz = elemento
+                pilha.append(elemento)
+                continue
+            pilha.pop()
+            if elemento.tag == tag and pilha:
+                ao_fechar(elemento)
+                pilha[-1].remove(elemento)
+        return raiz
+
+
+class ParserLxml:
+    nome = "lxml"
+
+    def __init__(self):
+        self.erros = (ET.ParseError, lxml_etree.XMLSyntaxError)
+        # Sem comentários/instruções: no lxml eles aparecem entre os filhos e
+        # seriam casados pelo "*" dos planos. Entidades externas ficam desligadas.
+        self._opcoes = dict(remove_comments=True, remove_pis=True, resolve_entities=False, no_network=True, huge_tree=True)
+        self._parser = lxml_etree.XMLParser(**self._opcoes)
+
+    def fromstring(self, conteudo):
+        return lxml_etree.fromstring(conteudo, self._parser)
+
+    def fluxo(self, arquivo, tag, ao_fechar):
+        # O filtro por tag roda em C: o Python só vê os elementos do grupo
+        eventos = lxml_etree.iterparse(arquivo, events=("end",), tag=tag, **self._opcoes)
+        for _, elemento in eventos:
+            ao_fechar(elemento)
+            elemento.getparent().remove(elemento)
+        return eventos.root
+
+
+def obter_parser(nome=BACKEND_PADRAO):
+    """Retorna o backend pedido ("lxml"/"stdlib") ou, sem nome, o mais rápido disponível."""
+    if nome == "stdlib":
+        return ParserStdlib()
+    if nome == "lxml" and lxml_etree is None:
+        raise ImportError("LEITOR_XML_PARSER=lxml, mas o lxml não está instalado")
+    if lxml_etree is not None:
+        return ParserLxml()
+    return ParserStdlib()
@@ -0,0 +1,113 @@
+import csv
+import io
+import os
+import re
+from collections import Counter, namedtuple
+
+# Este módulo é carregado pelos processos do motor paralelo: sem Streamlit nem pandas.
+
+# Etapas em que um XML pode ser rejeitado
+ETAPA_LEITURA = "leitura"
+ETAPA_PRE_VERIFICACAO = "pré-verificação"
+ETAPA_PARSE = "parse"
+ETAPA_EXTRACAO = "extração"
+ETAPAS = (ETAPA_LEITURA, ETAPA_PRE_VERIFICACAO, ETAPA_PARSE, ETAPA_EXTRACAO)
+
+# Pré-verificação: olha só o começo do arquivo antes de analisá-lo por inteiro ("0" desliga)
+PRE_VERIFICACAO_PADRAO = os.environ.get("LEITOR_XML_PRE_VERIFICACAO", "1") != "0"
+BYTES_PRE_VERIFICACAO = 4096
+NAMESPACE_FISCAL = b"portalfiscal.inf.br"
+
+# Um XML que não pôde entrar na planilha: o arquivo enviado (ZIP ou XML solto), o
+# caminho dentro do ZIP (vazio para XML solto), a etapa em que falhou e o motivo.
+DocumentoRejeitado = namedtuple("DocumentoRejeitado", ["arquivo", "membro", "etapa", "motivo"])
+COLUNAS_RELATORIO = ("Arquivo", "Membro do ZIP", "Etapa", "Motivo")
+
+# Tag de elemento (nome e atributos) e fim de cada coisa que pode vir antes da raiz
+_TAG = re.compile(rb"<([^\s/>!?]+)([^>]*)>")
+_FIM_PROLOGO = ((b"<!--", b"-->"), (b"<?", b"?>"), (b"<!DOCTYPE", b">"))
+
+
+def rejeitar(nome, membro, etapa, erro):
+    """DocumentoRejeitado a partir do nome completo ("origem/membro") e de uma exceção ou motivo."""
+    arquivo = nome[:-len(membro) - 1] if membro and nome.endswith("/" + membro) else nome
+    motivo = erro if isinstance(erro, str) else f"{type(erro).__name__}: {erro}"
+    return DocumentoRejeitado(arquivo, membro, etapa, motivo)
+
+
+def pre_verificar(conteudo):
+    """Motivo para descartar o XML sem analisá-lo, ou None se ele pode ser uma NFe/CTe/evento.
+
+    Olha só os primeiros bytes: a raiz de uma NFe, CTe ou evento sempre declara o
+    namespace do Portal Fiscal. Na dúvida (raiz fora do trecho lido), deixa passar.
+    """
+    inicio = bytes(conteudo[:BYTES_PRE_VERIFICACAO])
+    if inicio.startswith((b"\xff\xfe", b"\xfe\xff")):
+        # UTF-16: fica para o parser
+        return None
+    texto = inicio.lstrip(b"\xef\xbb\xbf \t\r\n")
+    if not texto:
+        return "arquivo vazio" if len(conteudo) <= BYTES_PRE_VERIFICACAO else None
+    if not texto.startswith(b"<"):
+        return "não é um XML"
+    raiz = _raiz(texto)
+    if raiz is None:
+        return None
+    if NAMESPACE_FISCAL not in raiz.group(2):
+        return f"raiz <{raiz.group(1).decode('utf-8', 'replace')}> fora do namespace da NFe/CTe"
+    return None
+
+
+def _raiz(texto):
+    """Primeira tag de elemento, pulando inteiros a declaração, comentários, PIs e DOCTYPE.
+
+    None quando não dá para ter certeza (trecho cortado no meio, DOCTYPE com
+    declarações internas): quem decide então é o parser.
+    """
+    posicao = 0
+    while True:
+        posicao = texto.find(b"<", posicao)
+        if posicao < 0:
+            return None
+        for inicio, fim in _FIM_PROLOGO:
+            if texto.startswith(inicio, posicao):
+                final = texto.find(fim, posicao + len(inicio))
+                if final < 0 or (inicio == b"<!DOCTYPE" and b"[" in texto[posicao:final]):
+                    return None
+                posicao = final + len(fim)
+                break
+        else:
+            return _TAG.match(texto, posicao)
+
+
+# ===============================
+# Relatório
+# ===============================
+def resumo_por_etapa(rejeitados):
+    """{etapa: quantidade}, na ordem em que as etapas acontecem."""
+    contagem = Counter(rejeitado.etapa for rejeitado in rejeitados)
+    return {etapa: contagem[etapa] for etapa in ETAPAS if contagem[etapa]}
+
+
+def relatorio_csv(rejeitados):
+    """Relatório dos XMLs em quarentena em CSV (";" e UTF-8 com BOM, para abrir direto no Excel)."""
+    saida = io.StringIO()
+    escritor = csv.writer(saida, delimiter=";", lineterminator="\n")
+    escritor.writerow(COLUNAS_RELATORIO)
+    escritor.writerows(rejeitados)
+    return saida.getvalue().encode("utf-8-sig")
+
+
+def com_origem(rejeitados, origem):
+    """Os rejeitados com `origem` (o nome do arquivo enviado) na frente de `arquivo`.
+
+    Para serem compartilhados entre envios do mesmo conteúdo, os rejeitados podem ser
+    listados com origem vazia: `arquivo` fica relativo ao envio ("" ou "/interno.zip").
+    """
+    return [rejeitado._replace(arquivo=origem + rejeitado.arquivo) for rejeitado in rejeitados]
+
+
+def descrever(rejeitado):
+    """Uma linha de texto para o terminal: "arquivo/membro [etapa] motivo"."""
+    nome = "/".join(filter(None, (rejeitado.arquivo, rejeitado.membro)))
+    return f"{nome} [{rejeitado.etapa}] {rejeitado.motivo}"
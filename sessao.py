@@ -0,0 +1,169 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from indice_chaves import IndiceChaves, REGRA_PADRAO, TP_CANCELAMENTO
+from tabela import TabelaColunar, dataframe_sem_duplicados, completar_dataframe, AUTORIZADA, CANCELADA
+from consulta import ConsultaNotas
+
+
+class ArquivoIngerido:
+    """O que foi extraído de um arquivo enviado, mais a Situação de cada linha."""
+
+    __slots__ = ("quantidade", "tabela", "documentos", "canceladas", "erros", "chaves_documentos", "chaves", "situacao")
+
+    def __init__(self, quantidade, tabela, documentos, erros):
+        self.quantidade = quantidade
+        self.tabela = tabela
+        self.documentos = documentos
+        self.canceladas = {
+            chave for info, _, _ in documentos for chave, tp_evento in info.eventos if tp_evento == TP_CANCELAMENTO
+        }
+        self.erros = erros
+        self.chaves_documentos = frozenset(info.chave for info, _, _ in documentos if info.chave is not None)
+        tamanho = len(tabela) if tabela is not None else 0
+        self.chaves = pd.Index(tabela.buffers[tabela.colunas.index("Chave de Acesso")]) if tamanho else pd.Index([])
+        self.situacao = np.zeros(tamanho, dtype=np.int8)
+
+
+class SessaoIngestao:
+    """Arquivos já ingeridos em uma sessão, para que adicionar ou remover um ZIP não refaça os outros.
+
+    Cada arquivo fica guardado pela identidade do upload (`file_id`). A Situação é
+    mantida por arquivo e, quando um cancelamento entra ou sai (com um ZIP ou pelo
+    armazém), só as linhas das chaves afetadas são recalculadas. XMLs repetidos entre
+    os arquivos são descartados pelo índice de chaves, refeito quando a lista muda.
+    """
+
+    def __init__(self, tipo_doc, layout, regra_duplicados=REGRA_PADRAO):
+        self.tipo_doc = tipo_doc
+        self.layout = layout
+        self.regra_duplicados = regra_duplicados
+        self.arquivos = {}
+        # Quantas fontes (arquivos da sessão e o armazém) trazem o cancelamento de cada chave
+        self.fontes_canceladas = Counter()
+        self.canceladas_externas = frozenset()
+        self.eventos_externos = {}
+        self.versao_externas = None
+        self.indice = IndiceChaves(regra_duplicados)
+        self._ids_base = None
+        self._base = None
+        self._mantidas = None
+        self._df = None
+        self._consulta = None
+
+    def __contains__(self, identificador):
+        return identificador in self.arquivos
+
+    def erros(self, ids):
+        return [erro for identificador in ids for erro in self.arquivos[identificador].erros]
+
+    def quantidade(self, ids):
+        return sum(self.arquivos[identificador].quantidade for identificador in ids)
+
+    def chaves_documentos(self):
+        """Chaves de acesso dos documentos de todos os arquivos da sessão."""
+        return frozenset().union(*(arquivo.chaves_documentos for arquivo in self.arquivos.values()))
+
+    # ===============================
+    # Cancelamentos
+    # ===============================
+    def _contar_canceladas(self, chaves, passo):
+        """Soma `passo` às fontes de cada chave e retorna as que mudaram de situação."""
+        afetadas = set()
+        for chave in chaves:
+            antes = self.fontes_canceladas[chave]
+            self.fontes_canceladas[chave] = antes + passo
+            if (antes > 0) != (antes + passo > 0):
+                afetadas.add(chave)
+            if self.fontes_canceladas[chave] <= 0:
+                del self.fontes_canceladas[chave]
+        return afetadas
+
+    def _atualizar_situacao(self, afetadas):
+        if not afetadas or self.tipo_doc != "NFe":
+            return
+        for arquivo in self.arquivos.values():
+            linhas = arquivo.chaves.isin(afetadas)
+            if linhas.any():
+                arquivo.situacao[linhas] = np.where(
+                    arquivo.chaves[linhas].isin(self.fontes_canceladas.keys()), CANCELADA, AUTORIZADA
+                )
+                self._df = None
+
+    def atualizar_eventos_externos(self, eventos, versao=None):
+        """Troca os eventos vindos de fora da sessão (o armazém, {chave: {tpEvento}}), identificados por `versao`."""
+        self.versao_externas = versao
+        if eventos == self.eventos_externos:
+            return
+        self.eventos_externos = eventos
+        # A coluna Eventos depende de todos; a Situação, só das chaves que mudaram
+        self._df = None
+        chaves = frozenset(chave for chave, tipos in eventos.items() if TP_CANCELAMENTO in tipos)
+        afetadas = self._contar_canceladas(chaves - self.canceladas_externas, 1)
+        afetadas |= self._contar_canceladas(self.canceladas_externas - chaves, -1)
+        self.canceladas_externas = chaves
+        self._atualizar_situacao(afetadas)
+
+    # ===============================
+    # Arquivos
+    # ===============================
+    def adicionar(self, identificador, quantidade, extraido):
+        arquivo = ArquivoIngerido(quantidade, *extraido)
+        afetadas = self._contar_canceladas(arquivo.canceladas, 1)
+        # Linhas existentes: só as chaves que o novo arquivo cancelou
+        self._atualizar_situacao(afetadas)
+        self.arquivos[identificador] = arquivo
+        if self.tipo_doc == "NFe" and len(arquivo.situacao):
+            arquivo.situacao[:] = arquivo.chaves.isin(self.fontes_canceladas.keys())
+
+    def manter_somente(self, ids):
+        """Descarta os arquivos que saíram da lista de uploads, desfazendo seus cancelamentos."""
+        ids = set(ids)
+        afetadas = set()
+        for identificador in [identificador for identificador in self.arquivos if identificador not in ids]:
+            arquivo = self.arquivos.pop(identificador)
+            afetadas |= self._contar_canceladas(arquivo.canceladas, -1)
+        self._atualizar_situacao(afetadas)
+
+    # ===============================
+    # DataFrame
+    # ===============================
+    def dataframe(self, ids):
+        """DataFrame dos arquivos em `ids` (na ordem do upload), com a Situação das NFe.
+
+        As colunas extraídas e o índice de chaves só são refeitos quando a lista de
+        arquivos muda; uma mudança apenas nos eventos troca só as colunas que dependem deles.
+        """
+        ids = tuple(ids)
+        if ids != self._ids_base:
+            self.indice = IndiceChaves(self.regra_duplicados)
+            deslocamento = 0
+            for identificador in ids:
+                arquivo = self.arquivos[identificador]
+                self.indice.adicionar_documentos(arquivo.documentos, deslocamento)
+                deslocamento += len(arquivo.situacao)
+            tabela = TabelaColunar.concatenar([self.arquivos[identificador].tabela for identificador in ids])
+            self._base, self._mantidas = dataframe_sem_duplicados(tabela, self.indice) if tabela is not None else (None, None)
+            self._ids_base = ids
+            self._df = None
+        if self._base is None:
+            return None
+        if self._df is None:
+            situacao = None
+            if self.tipo_doc == "NFe":
+                situacao = np.concatenate([self.arquivos[identificador].situacao for identificador in ids])
+            self._df = completar_dataframe(
+                self._base, self.indice, self.tipo_doc, situacao, self._mantidas, self.eventos_externos
+            )
+        return self._df
+
+    def consulta(self, ids):
+        """Consulta (filtros, páginas, agregados) sobre o DataFrame de `ids`; os índices só são refeitos se ele mudar."""
+        df = self.dataframe(ids)
+        if df is None:
+            return None
+        if self._consulta is None or self._consulta.df is not df:
+            self._consulta = ConsultaNotas(df)
+        return self._consulta
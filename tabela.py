@@ -0,0 +1,171 @@
+from array import array
+
+from extratores import TIPO_DAS_COLUNAS, TEXTO, NUMERO, DATA, NUMERO_VAZIO, DATA_VAZIA
+from indice_chaves import IndiceChaves, TP_CANCELAMENTO
+
+# Colunas com poucos valores distintos: no pandas viram Categorical
+COLUNAS_CATEGORICAS = ("CFOP", "UF Emitente", "Modelo", "Situação", "CST/CSOSN", "CST ICMS", "Status da NFe")
+
+# Buffers por tipo: números em float64, datas em int64 (ns desde 1970), texto em lista
+_CODIGOS_ARRAY = {NUMERO: "d", DATA: "q"}
+_VAZIOS = {NUMERO: NUMERO_VAZIO, DATA: DATA_VAZIA, TEXTO: None}
+# Estimativa de memória do texto: um ponteiro por célula na lista e, por str, o cabeçalho
+# do objeto no CPython mais um byte por caractere (os textos extraídos são quase todos ASCII)
+BYTES_PONTEIRO = 8
+BYTES_CABECALHO_TEXTO = 49
+
+
+class TabelaColunar:
+    """Linhas extraídas guardadas coluna a coluna, em buffers já do tamanho final.
+
+    Números e datas ficam em `array` (memória contígua, sem um objeto Python por
+    célula) e viram colunas do DataFrame sem cópia.
+    """
+
+    __slots__ = ("colunas", "tipos", "buffers", "tamanho")
+
+    def __init__(self, colunas, tamanho):
+        self.colunas = tuple(colunas)
+        self.tipos = tuple(TIPO_DAS_COLUNAS.get(coluna, TEXTO) for coluna in self.colunas)
+        self.tamanho = tamanho
+        self.buffers = [
+            array(_CODIGOS_ARRAY[tipo], [_VAZIOS[tipo]]) * tamanho if tipo in _CODIGOS_ARRAY else [None] * tamanho
+            for tipo in self.tipos
+        ]
+
+    def __len__(self):
+        return self.tamanho
+
+    def bytes_estimados(self):
+        """Memória aproximada dos buffers: arrays pelo `itemsize`, textos pela estimativa por str."""
+        tamanho = 0
+        for buffer in self.buffers:
+            if isinstance(buffer, array):
+                tamanho += buffer.itemsize * len(buffer)
+            else:
+                tamanho += BYTES_PONTEIRO * len(buffer)
+                tamanho += sum(BYTES_CABECALHO_TEXTO + len(texto) for texto in buffer if texto is not None)
+        return tamanho
+
+    @classmethod
+    def de_linhas(cls, colunas, linhas):
+        """Monta a tabela a partir de tuplas na ordem de `colunas` (como saem dos planos de extração)."""
+        tabela = cls(colunas, 0)
+        tabela.tamanho = len(linhas)
+        tabela.buffers = [
+            array(_CODIGOS_ARRAY[tipo], [linha[j] for linha in linhas]) if tipo in _CODIGOS_ARRAY else [linha[j] for linha in linhas]
+            for j, tipo in enumerate(tabela.tipos)
+        ]
+        return tabela
+
+    @classmethod
+    def concatenar(cls, tabelas):
+        """Junta tabelas com as mesmas colunas, copiando cada buffer uma única vez."""
+        tabelas = [tabela for tabela in tabelas if tabela is not None and len(tabela)]
+        if not tabelas:
+            return None
+        if len(tabelas) == 1:
+            return tabelas[0]
+        juntas = cls(tabelas[0].colunas, sum(len(tabela) for tabela in tabelas))
+        inicio = 0
+        for tabela in tabelas:
+            fim = inicio + len(tabela)
+            for buffer, origem in zip(juntas.buffers, tabela.buffers):
+                buffer[inicio:fim] = origem
+            inicio = fim
+        return juntas
+
+    def para_dataframe(self, categoricas=COLUNAS_CATEGORICAS):
+        # pandas/numpy só são importados aqui: os workers não precisam deles
+        import numpy as np
+        import pandas as pd
+
+        dados = {}
+        for coluna, tipo, buffer in zip(self.colunas, self.tipos, self.buffers):
+            if tipo == NUMERO:
+                dados[coluna] = np.frombuffer(buffer, dtype=np.float64)
+            elif tipo == DATA:
+                dados[coluna] = np.frombuffer(buffer, dtype=np.int64).view("datetime64[ns]")
+            elif coluna in categoricas:
+                dados[coluna] = pd.Categorical(buffer)
+            else:
+                dados[coluna] = buffer
+        return pd.DataFrame(dados, copy=False)
+
+
+# Códigos da coluna Situação das NFe (Categorical)
+SITUACOES = ["Autorizada", "Cancelada"]
+AUTORIZADA = 0
+CANCELADA = 1
+
+
+def linhas_mantidas(tamanho, descartados):
+    """Máscara das linhas que ficam, dados os intervalos (inicio, fim) descartados pelo índice de chaves."""
+    import numpy as np
+
+    mascara = np.ones(tamanho, dtype=bool)
+    for inicio, fim in descartados:
+        mascara[inicio:fim] = False
+    return mascara
+
+
+def acrescentar_vinculos(df, indice, tipo_doc, eventos_extra=None):
+    """Acrescenta as colunas ligadas pela chave de acesso (eventos da nota, CTe <-> NFe)."""
+    for coluna, valores in indice.colunas_de_vinculo(tipo_doc, eventos_extra).items():
+        df[coluna] = df["Chave de Acesso"].map(valores)
+
+
+def dataframe_sem_duplicados(tabela, indice):
+    """DataFrame da tabela sem as linhas dos XMLs repetidos descartados pelo índice.
+
+    Retorna (df, máscara das linhas mantidas ou None se nada foi descartado).
+    """
+    df = tabela.para_dataframe()
+    if not indice.descartados:
+        return df, None
+    mantidas = linhas_mantidas(len(df), indice.descartados)
+    return df[mantidas].reset_index(drop=True), mantidas
+
+
+def completar_dataframe(base, indice, tipo_doc, situacao=None, mantidas=None, eventos_extra=None):
+    """Cópia rasa de `base` com a Situação das NFe e as colunas de vínculo do índice.
+
+    `situacao` traz os códigos (AUTORIZADA/CANCELADA) de cada linha da tabela antes do
+    descarte dos duplicados (`mantidas`); sem ele, a Situação vem dos cancelamentos do
+    índice e de `eventos_extra` ({chave: {tpEvento}}, eventos de fora, como o armazém).
+    """
+    import pandas as pd
+
+    # As colunas numéricas vêm de buffers somente leitura e não são alteradas
+    df = base.copy(deep=False)
+    if tipo_doc == "NFe":
+        if situacao is None:
+            canceladas = indice.canceladas()
+            canceladas.update(chave for chave, tipos in (eventos_extra or {}).items() if TP_CANCELAMENTO in tipos)
+            situacao = df["Chave de Acesso"].isin(canceladas).to_numpy().astype("int8")
+        elif mantidas is not None:
+            situacao = situacao[mantidas]
+        df["Situação"] = pd.Categorical.from_codes(situacao, categories=SITUACOES)
+    acrescentar_vinculos(df, indice, tipo_doc, eventos_extra)
+    return df
+
+
+def juntar_em_dataframe(extraidos, tipo_doc, eventos_extra=None, indice=None):
+    """Junta vários (tabela, documentos, erros) em um DataFrame.
+
+    XMLs repetidos (mesma chave de acesso) são descartados pela regra do `indice`,
+    a Situação das NFe vem dos eventos de cancelamento e as colunas de vínculo
+    vêm do mesmo índice. `eventos_extra` ({chave: {tpEvento}}) soma eventos de fora (o armazém).
+    """
+    indice = indice if indice is not None else IndiceChaves()
+    deslocamento = 0
+    for tabela, documentos, _ in extraidos:
+        indice.adicionar_documentos(documentos, deslocamento)
+        deslocamento += len(tabela) if tabela is not None else 0
+
+    tabela = TabelaColunar.concatenar([tabela for tabela, _, _ in extraidos])
+    if tabela is None:
+        return None
+    # Situação só é conhecida após ler todos os eventos de cancelamento (de todos os ZIPs)
+    base, _ = dataframe_sem_duplicados(tabela, indice)
+    return completar_dataframe(base, indice, tipo_doc, eventos_extra=eventos_extra)
@@ -0,0 +1,175 @@
+"""Paridade entre os backends de XML: lxml e biblioteca padrão extraem exatamente o mesmo."""
+import math
+
+import pytest
+
+from extratores import classificar_xml, tipo_documento, LAYOUT_CABECALHO, LAYOUT_ITEM, NFE, CTE
+from parser_xml import ParserStdlib, ParserLxml, lxml_etree
+
+
+def chave(modelo, numero):
+    # cUF + AAMM + CNPJ + modelo + série + número + tpEmis + cNF + DV = 44 dígitos
+    return f"35" f"2401" f"12345678000199" f"{modelo}" f"001" f"{numero:09d}" f"1" f"12345678" f"0"
+
+
+def det(n, grupo_icms="ICMS00"):
+    return (
+        f'<det nItem="{n}"><prod><cProd>{n}</cProd><xProd>Produto {n}</xProd><CFOP>{5102 if n % 2 else 6102}</CFOP>'
+        f'<vProd>{n * 10}.50</vProd><cBenef>SP000{n}</cBenef></prod>'
+        f'<imposto><ICMS><{grupo_icms}><orig>0</orig><CST>00</CST><vBC>100.00</vBC><pICMS>18.00</pICMS>'
+        f'<vICMS>{n}.80</vICMS></{grupo_icms}></ICMS>'
+        f'<IPI><cEnq>999</cEnq><IPITrib><CST>50</CST><vIPI>1.{n}0</vIPI></IPITrib></IPI>'
+        f'<PIS><PISAliq><CST>01</CST><vPIS>0.65</vPIS></PISAliq></PIS>'
+        f'<COFINS><COFINSAliq><CST>01</CST><vCOFINS>3.00</vCOFINS></COFINSAliq></COFINS></imposto></det>'
+    )
+
+
+def nfe(modelo="55", numero=1, itens=3, protocolo=True, comentario=False, status="100", recebimento="2024-01-15T10:31:00-03:00"):
+    ch = chave(modelo, numero)
+    extra = "<!-- gerado pelo ERP --><?erp versao='1'?>" if comentario else ""
+    inf = (
+        f'<NFe xmlns="{NFE}"><infNFe Id="NFe{ch}" versao="4.00">{extra}'
+        f'<ide><cUF>35</cUF><mod>{modelo}</mod><serie>1</serie><nNF>{numero}</nNF>'
+        f'<dhEmi>2024-01-15T10:30:00-03:00</dhEmi></ide>'
+        f'<emit><CNPJ>12345678000199</CNPJ><xNome>Empresa Ltda</xNome><enderEmit><UF>SP</UF></enderEmit></emit>'
+        + "".join(det(n) for n in range(1, itens + 1)) +
+        f'<total><ICMSTot><vICMS>10.00</vICMS><vST>0.00</vST><vProd>100.00</vProd><vIPI>1.00</vIPI>'
+        f'<vPIS>0.65</vPIS><vCOFINS>3.00</vCOFINS><vNF>105.00</vNF><vICMSDeson>0.00</vICMSDeson></ICMSTot></total>'
+        f'<transp><modFrete>0</modFrete><vFrete>5.00</vFrete></transp></infNFe></NFe>'
+    )
+    if not protocolo:
+        return ('<?xml version="1.0" encoding="UTF-8"?>' + inf).encode("utf-8")
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?><nfeProc xmlns="{NFE}" versao="4.00">{inf}'
+        f'<protNFe versao="4.00"><infProt><chNFe>{ch}</chNFe><dhRecbto>{recebimento}</dhRecbto>'
+        f'<cStat>{status}</cStat></infProt></protNFe></nfeProc>'
+    ).encode("utf-8")
+
+
+def evento(tp_evento, numero=1):
+    ch = chave("55", numero)
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?><procEventoNFe xmlns="{NFE}" versao="1.00">'
+        f'<evento versao="1.00"><infEvento Id="ID{tp_evento}{ch}01"><cOrgao>35</cOrgao><chNFe>{ch}</chNFe>'
+        f'<dhEvento>2024-02-01T10:00:00-03:00</dhEvento><tpEvento>{tp_evento}</tpEvento><nSeqEvento>1</nSeqEvento>'
+        f'</infEvento></evento><retEvento versao="1.00"><infEvento><cStat>135</cStat><chNFe>{ch}</chNFe>'
+        f'<tpEvento>{tp_evento}</tpEvento></infEvento></retEvento></procEventoNFe>'
+    ).encode("utf-8")
+
+
+# (proc, documento, modelo) do CTe, do CTe OS e do CTe Simplificado
+CTE_NORMAL = ("cteProc", "CTe", "57")
+CTE_OS = ("cteOSProc", "CTeOS", "67")
+CTE_SIMPLIFICADO = ("cteSimpProc", "CTeSimp", "57")
+
+
+def cte(numero=1, leiaute=CTE_NORMAL):
+    proc, documento, modelo = leiaute
+    ch = chave(modelo, numero)
+    # O CTe Simplificado traz o valor em total/vTPrest
+    valor = "total" if documento == "CTeSimp" else "vPrest"
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?><{proc} xmlns="{CTE}" versao="4.00"><{documento}>'
+        f'<infCte Id="CTe{ch}" versao="4.00"><ide><cUF>35</cUF><mod>{modelo}</mod><nCT>{numero}</nCT>'
+        f'<dhEmi>2024-03-01T08:00:00-03:00</dhEmi></ide>'
+        f'<emit><CNPJ>11111111000111</CNPJ><xNome>Transportadora</xNome><enderEmit><UF>PR</UF></enderEmit></emit>'
+        f'<{valor}><vTPrest>50.00</vTPrest></{valor}><imp><ICMS><ICMS00><CST>00</CST><vBC>50.00</vBC>'
+        f'<pICMS>12.00</pICMS><vICMS>6.00</vICMS></ICMS00></ICMS></imp>'
+        f'<infCTeNorm><infDoc><infNFe><chave>{chave("55", 1)}</chave></infNFe><infNFe><chave>{chave("55", 2)}</chave>'
+        f'</infNFe></infDoc></infCTeNorm></infCte></{documento}>'
+        f'<protCTe><infProt><chCTe>{ch}</chCTe><dhRecbto>2024-03-01T08:01:00-03:00</dhRecbto><cStat>100</cStat>'
+        f'</infProt></protCTe></{proc}>'
+    ).encode("utf-8")
+
+
+def embrulhado(conteudo):
+    # Documento dentro de outra tag (exportações de ERP, lotes)
+    documento = conteudo.decode("utf-8").split("?>", 1)[1]
+    return f'<?xml version="1.0" encoding="UTF-8"?><exportacao><item>{documento}</item></exportacao>'.encode("utf-8")
+
+
+AMOSTRAS = {
+    "nfe": nfe(),
+    "nfce": nfe(modelo="65", numero=2, itens=1),
+    "nfe-sem-protocolo": nfe(numero=3, protocolo=False),
+    "nfe-com-comentarios": nfe(numero=4, comentario=True),
+    "cte": cte(),
+    "cte-os": cte(numero=2, leiaute=CTE_OS),
+    "cte-simplificado": cte(numero=3, leiaute=CTE_SIMPLIFICADO),
+    "nfe-embrulhada": embrulhado(nfe(numero=5)),
+    "cancelamento": evento("110111"),
+    "carta-de-correcao": evento("110110"),
+}
+MODOS = [
+    ("NFe", LAYOUT_CABECALHO),
+    ("NFe", LAYOUT_ITEM),
+    ("CTe", LAYOUT_CABECALHO),
+]
+
+requer_lxml = pytest.mark.skipif(lxml_etree is None, reason="lxml não instalado")
+
+
+def normalizar(linhas):
+    # NaN != NaN: troca por None para comparar as linhas
+    return [
+        tuple(None if isinstance(valor, float) and math.isnan(valor) else valor for valor in linha)
+        for linha in linhas
+    ]
+
+
+@requer_lxml
+@pytest.mark.parametrize("tipo_doc, layout", MODOS)
+@pytest.mark.parametrize("amostra", sorted(AMOSTRAS))
+def test_backends_extraem_o_mesmo(amostra, tipo_doc, layout):
+    conteudo = AMOSTRAS[amostra]
+    colunas_std, linhas_std, info_std = classificar_xml(conteudo, tipo_doc, layout, ParserStdlib())
+    colunas_lxml, linhas_lxml, info_lxml = classificar_xml(conteudo, tipo_doc, layout, ParserLxml())
+    assert colunas_lxml == colunas_std
+    assert normalizar(linhas_lxml) == normalizar(linhas_std)
+    assert info_lxml == info_std
+
+
+@pytest.mark.parametrize("amostra, tipo_doc, layout, quantidade", [
+    ("nfe", "NFe", LAYOUT_CABECALHO, 1),
+    ("nfe", "NFe", LAYOUT_ITEM, 3),
+    ("nfce", "NFe", LAYOUT_ITEM, 1),
+    ("nfe-sem-protocolo", "NFe", LAYOUT_CABECALHO, 1),
+    ("nfe-com-comentarios", "NFe", LAYOUT_ITEM, 3),
+    ("cte", "CTe", LAYOUT_CABECALHO, 1),
+    ("cte", "NFe", LAYOUT_CABECALHO, 0),
+    ("cte-os", "CTe", LAYOUT_CABECALHO, 1),
+    ("cte-os", "NFe", LAYOUT_ITEM, 0),
+    ("cte-simplificado", "CTe", LAYOUT_CABECALHO, 1),
+    ("nfe-embrulhada", "NFe", LAYOUT_CABECALHO, 1),
+    ("nfe-embrulhada", "NFe", LAYOUT_ITEM, 3),
+    ("cancelamento", "NFe", LAYOUT_CABECALHO, 0),
+    ("carta-de-correcao", "NFe", LAYOUT_ITEM, 0),
+])
+def test_amostras_geram_as_linhas_esperadas(amostra, tipo_doc, layout, quantidade):
+    # Garante que a paridade compara extrações reais, não duas listas vazias
+    _, linhas, _ = classificar_xml(AMOSTRAS[amostra], tipo_doc, layout, ParserStdlib())
+    assert len(linhas) == quantidade
+
+
+def test_informacoes_do_documento():
+    parser = ParserStdlib()
+    assert classificar_xml(AMOSTRAS["nfe"], "NFe", parser=parser)[2].autorizado
+    sem_protocolo = classificar_xml(AMOSTRAS["nfe-sem-protocolo"], "NFe", parser=parser)[2]
+    assert sem_protocolo.chave == chave("55", 3) and not sem_protocolo.autorizado
+    assert classificar_xml(AMOSTRAS["cancelamento"], "NFe", parser=parser)[2].eventos == ((chave("55", 1), "110111"),)
+    assert classificar_xml(AMOSTRAS["cte"], "CTe", parser=parser)[2].referencias == (chave("55", 1), chave("55", 2))
+    # CTe OS e CTe Simplificado também entram no índice de chaves, mesmo num ZIP de NFe
+    cte_os = classificar_xml(AMOSTRAS["cte-os"], "NFe", parser=parser)[2]
+    assert cte_os.chave == chave("67", 2) and cte_os.autorizado and tipo_documento(cte_os) == "CTe OS"
+    assert classificar_xml(AMOSTRAS["cte-simplificado"], "CTe", parser=parser)[2].chave == chave("57", 3)
+
+
+@pytest.mark.parametrize("parser", [
+    ParserStdlib,
+    pytest.param(ParserLxml, marks=requer_lxml),
+])
+@pytest.mark.parametrize("layout", [LAYOUT_CABECALHO, LAYOUT_ITEM])
+def test_xml_quebrado_levanta_erro_do_backend(parser, layout):
+    parser = parser()
+    with pytest.raises(parser.erros):
+        classificar_xml(b"<nfeProc><quebrado", "NFe", layout, parser)
@@ -0,0 +1,61 @@
+"""Quarentena: a pré-verificação só descarta o que com certeza não é NFe/CTe/evento, e os nomes dos rejeitados."""
+import pytest
+
+from extratores import classificar_xml
+from parser_xml import ParserStdlib
+from quarentena import pre_verificar, rejeitar, com_origem, BYTES_PRE_VERIFICACAO, ETAPA_LEITURA, ETAPA_PARSE
+from test_parser_parity import nfe, cte, evento
+
+DECLARACAO = b'<?xml version="1.0" encoding="UTF-8"?>'
+
+
+def com_prologo(conteudo, prologo):
+    # Insere `prologo` entre a declaração <?xml ...?> e a raiz
+    return conteudo.replace(DECLARACAO, DECLARACAO + prologo, 1)
+
+
+@pytest.mark.parametrize("conteudo", [
+    nfe(),
+    nfe(protocolo=False),
+    cte(),
+    evento("110111"),
+    b"\xef\xbb\xbf" + nfe(),
+    com_prologo(nfe(), b"<!-- exportado por <ERP> v2 -->"),
+    com_prologo(nfe(), b"<!-- <a/> --><?erp <b>?>\n<!-- -->"),
+    com_prologo(nfe(), b'<!DOCTYPE nfeProc SYSTEM "nfe.dtd">'),
+    # Comentário maior que o trecho lido: na dúvida, o parser decide
+    com_prologo(nfe(), b"<!-- " + b"x" * BYTES_PRE_VERIFICACAO + b" -->"),
+])
+def test_documentos_fiscais_passam(conteudo):
+    assert pre_verificar(conteudo) is None
+
+
+def test_comentario_com_tag_antes_da_raiz_e_extraido():
+    conteudo = com_prologo(nfe(), b"<!-- exportado por <ERP> v2 -->")
+    assert pre_verificar(conteudo) is None
+    assert len(classificar_xml(conteudo, "NFe", parser=ParserStdlib())[1]) == 1
+
+
+@pytest.mark.parametrize("conteudo, motivo", [
+    (b"", "arquivo vazio"),
+    (b"  \r\n", "arquivo vazio"),
+    (b"PK\x03\x04", "não é um XML"),
+    (DECLARACAO + b"<!-- <nfeProc> --><pedido><item/></pedido>", "raiz <pedido> fora do namespace da NFe/CTe"),
+])
+def test_arquivos_estranhos_sao_rejeitados(conteudo, motivo):
+    assert pre_verificar(conteudo) == motivo
+
+
+def test_rejeitados_sem_origem_recebem_o_nome_do_envio():
+    # Listados com origem vazia (como no cache do app), os nomes ficam relativos ao ZIP enviado
+    rejeitados = [
+        rejeitar("/pasta/a.xml", "pasta/a.xml", ETAPA_PARSE, "quebrado"),
+        rejeitar("/interno.zip", "interno.zip", ETAPA_LEITURA, "não é ZIP"),
+        rejeitar("", "", ETAPA_LEITURA, "não é ZIP"),
+    ]
+    assert [rejeitado.arquivo for rejeitado in rejeitados] == ["", "", ""]
+    aninhado = rejeitar("/interno.zip/b.xml", "b.xml", ETAPA_PARSE, "quebrado")
+    nomeados = com_origem(rejeitados + [aninhado], "notas.zip")
+    assert [(rejeitado.arquivo, rejeitado.membro) for rejeitado in nomeados] == [
+        ("notas.zip", "pasta/a.xml"), ("notas.zip", "interno.zip"), ("notas.zip", ""), ("notas.zip/interno.zip", "b.xml"),
+    ]
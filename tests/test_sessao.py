@@ -0,0 +1,82 @@
+"""Sessão de ingestão: Situação incremental (ZIPs e armazém) e regras de duplicados do índice de chaves."""
+import pytest
+
+from extratores import LAYOUT_CABECALHO
+from indice_chaves import REGRA_AUTORIZADA, REGRA_RECENTE, TP_CANCELAMENTO
+from paralelo import processar_lote, juntar_resultados
+from sessao import SessaoIngestao
+from test_parser_parity import chave, nfe, evento
+
+
+def extrair(*xmls):
+    """(quantidade, extraido) de um "ZIP" com os XMLs, como o pipeline entrega à sessão."""
+    arquivos = [(f"envio.zip/{n}.xml", f"{n}.xml", conteudo) for n, conteudo in enumerate(xmls)]
+    return len(arquivos), juntar_resultados([processar_lote(0, "NFe", LAYOUT_CABECALHO, arquivos)])
+
+
+def situacoes(sessao, ids):
+    df = sessao.dataframe(ids)
+    return dict(zip(df["Chave de Acesso"], df["Situação"]))
+
+
+@pytest.fixture
+def sessao():
+    sessao = SessaoIngestao("NFe", LAYOUT_CABECALHO)
+    sessao.adicionar("notas", *extrair(nfe(numero=1), nfe(numero=2)))
+    return sessao
+
+
+def test_zip_com_cancelamento_marca_a_nota(sessao):
+    assert set(situacoes(sessao, ["notas"]).values()) == {"Autorizada"}
+    sessao.adicionar("eventos", *extrair(evento(TP_CANCELAMENTO, numero=1)))
+    assert situacoes(sessao, ["notas", "eventos"]) == {chave("55", 1): "Cancelada", chave("55", 2): "Autorizada"}
+
+
+def test_remover_o_zip_do_cancelamento_volta_a_autorizada(sessao):
+    sessao.adicionar("eventos", *extrair(evento(TP_CANCELAMENTO, numero=1)))
+    situacoes(sessao, ["notas", "eventos"])
+    sessao.manter_somente(["notas"])
+    assert situacoes(sessao, ["notas"]) == {chave("55", 1): "Autorizada", chave("55", 2): "Autorizada"}
+
+
+def test_cancelamento_do_armazem_continua_valendo(sessao):
+    sessao.adicionar("eventos", *extrair(evento(TP_CANCELAMENTO, numero=1)))
+    sessao.atualizar_eventos_externos({chave("55", 1): {TP_CANCELAMENTO}}, versao=1)
+    # A chave tem duas fontes de cancelamento: tirar o ZIP não desfaz a do armazém
+    sessao.manter_somente(["notas"])
+    assert situacoes(sessao, ["notas"])[chave("55", 1)] == "Cancelada"
+    sessao.atualizar_eventos_externos({}, versao=2)
+    assert situacoes(sessao, ["notas"])[chave("55", 1)] == "Autorizada"
+
+
+def test_carta_de_correcao_nao_cancela(sessao):
+    sessao.adicionar("eventos", *extrair(evento("110110", numero=1)))
+    df = sessao.dataframe(["notas", "eventos"])
+    assert set(df["Situação"]) == {"Autorizada"}
+    assert df.set_index("Chave de Acesso").at[chave("55", 1), "Eventos"] == "Carta de Correção"
+
+
+# Mesma chave em três XMLs: autorizado antes, sem protocolo e denegado (110) depois
+AUTORIZADA_ANTES = nfe(numero=7, status="100", recebimento="2024-01-15T10:31:00-03:00")
+SEM_PROTOCOLO = nfe(numero=7, protocolo=False)
+DENEGADA_DEPOIS = nfe(numero=7, status="110", recebimento="2024-01-20T09:00:00-03:00")
+
+
+@pytest.mark.parametrize("regra, xmls, status", [
+    # "autorizada": o autorizado vence, venha antes ou depois
+    (REGRA_AUTORIZADA, (AUTORIZADA_ANTES, DENEGADA_DEPOIS), "100"),
+    (REGRA_AUTORIZADA, (DENEGADA_DEPOIS, AUTORIZADA_ANTES), "100"),
+    (REGRA_AUTORIZADA, (SEM_PROTOCOLO, AUTORIZADA_ANTES), "100"),
+    # "recente": vence o recebido por último, com ou sem autorização
+    (REGRA_RECENTE, (AUTORIZADA_ANTES, DENEGADA_DEPOIS), "110"),
+    (REGRA_RECENTE, (DENEGADA_DEPOIS, AUTORIZADA_ANTES), "110"),
+    (REGRA_RECENTE, (AUTORIZADA_ANTES, SEM_PROTOCOLO), "100"),
+])
+def test_regra_de_duplicados_escolhe_o_xml(regra, xmls, status):
+    sessao = SessaoIngestao("NFe", LAYOUT_CABECALHO, regra)
+    # Um XML por arquivo: o duplicado vem de outro ZIP
+    for n, xml in enumerate(xmls):
+        sessao.adicionar(n, *extrair(xml))
+    df = sessao.dataframe(range(len(xmls)))
+    assert list(df["Status da NFe"]) == [status]
+    assert sessao.indice.linhas_duplicadas == len(xmls) - 1